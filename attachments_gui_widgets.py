@@ -7,22 +7,205 @@ Gotowe widgety GUI do obsługi załączników w dialogach ofert i zamówień
 
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
-import tkinter as tk
 from tkinter import ttk
 import os
-import tempfile
-import subprocess
-import platform
+import sys
+import threading
+from collections import deque
+from functools import cached_property
+import queue
 
 from attachments_manager import AttachmentsManager, format_file_size, get_file_icon_by_type
 
 
+# Filtry dialogu wyboru plików w AttachmentsWidget.add_files
+_ADD_FILES_FILETYPES = (
+    ("Wszystkie pliki", "*.*"),
+    ("PDF", "*.pdf"),
+    ("Word", "*.doc;*.docx"),
+    ("Excel", "*.xls;*.xlsx"),
+    ("PowerPoint", "*.ppt;*.pptx"),
+    ("Obrazy", "*.png;*.jpg;*.jpeg;*.gif;*.bmp;*.svg"),
+    ("CAD 2D", "*.dxf;*.dwg"),
+    ("CAD 3D", "*.step;*.stp;*.igs;*.iges"),
+    ("Tekst", "*.txt;*.csv"),
+    ("Archiwa", "*.zip;*.rar;*.7z"),
+)
+
+# Czcionki współdzielone przez wszystkie widgety/dialogi modułu (tworzone przy pierwszym użyciu)
+_FONT_CACHE = {}
+
+
+def _font(size: int, weight: str = "normal") -> ctk.CTkFont:
+    """Zwraca współdzieloną instancję CTkFont dla danego rozmiaru i grubości"""
+    key = (size, weight)
+    font = _FONT_CACHE.get(key)
+    if font is None:
+        font = _FONT_CACHE[key] = ctk.CTkFont(size=size, weight=weight)
+    return font
+
+
+# Otwieranie pliku/folderu w domyślnej aplikacji - wybór platformy raz przy imporcie
+# (Popen w osobnej sesji - nie czekamy na zakończenie open/xdg-open w wątku Tk)
+def _spawn_opener(opener: str, path: str):
+    import subprocess  # potrzebny tylko przy otwieraniu plików (macOS/Linux)
+
+    subprocess.Popen(
+        [opener, path],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+        close_fds=True
+    )
+
+
+if sys.platform == 'win32':
+    _open_native = os.startfile  # os.startfile nie blokuje
+elif sys.platform == 'darwin':  # macOS
+    def _open_native(path: str):
+        _spawn_opener('open', path)
+else:  # Linux
+    def _open_native(path: str):
+        _spawn_opener('xdg-open', path)
+
+
+# Powyżej tej liczby plików rozmiary sprawdzane są równolegle
+_PARALLEL_STAT_THRESHOLD = 32
+_PARALLEL_STAT_WORKERS = 8
+
+
+def _selection_total_size(file_paths, limit: int) -> int:
+    """
+    Sumuje rozmiary wybranych plików
+
+    Pliki z askopenfilenames zwykle leżą w jednym katalogu - wtedy rozmiary
+    są zbierane jednym przejściem os.scandir (na Windows bez dodatkowych
+    wywołań stat). Pozostałe pliki są sprawdzane os.stat - przy dużej liczbie
+    plików w puli wątków (stat zwalnia GIL, co pomaga na dyskach sieciowych).
+    Sumowanie kończy się po przekroczeniu limitu.
+
+    Args:
+        file_paths: Ścieżki wybranych plików
+        limit: Limit rozmiaru w bajtach
+
+    Returns:
+        Suma rozmiarów (po przekroczeniu limitu - suma częściowa > limit)
+    """
+    sizes = {}
+    directories = {os.path.dirname(p) for p in file_paths}
+    if len(file_paths) > 1 and len(directories) == 1:
+        directory = directories.pop()
+        wanted = {os.path.basename(p): p for p in file_paths}
+        with os.scandir(directory or '.') as entries:
+            for entry in entries:
+                file_path = wanted.get(entry.name)
+                if file_path is not None:
+                    sizes[file_path] = entry.stat().st_size
+                    if len(sizes) == len(wanted):
+                        break
+
+    missing = [p for p in file_paths if p not in sizes]
+    if len(missing) > _PARALLEL_STAT_THRESHOLD:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=_PARALLEL_STAT_WORKERS) as executor:
+            for file_path, stat_result in zip(missing, executor.map(os.stat, missing)):
+                sizes[file_path] = stat_result.st_size
+
+    total_size = 0
+    for file_path in file_paths:
+        size = sizes.get(file_path)
+        if size is None:
+            size = os.stat(file_path).st_size
+        total_size += size
+        if total_size > limit:
+            break
+    return total_size
+
+
+def _bulk_insert(tree: ttk.Treeview, rows):
+    """
+    Wstawia wiele wierszy do Treeview jednym ciągiem
+
+    Na czas wstawiania odłącza yscrollcommand, żeby scrollbar nie był
+    przeliczany po każdym wierszu.
+
+    Args:
+        tree: Docelowy Treeview
+        rows: Lista krotek (iid, values) przygotowana przed wstawianiem;
+            iid=None oznacza identyfikator nadany przez Tk
+    """
+    yscrollcommand = tree.cget('yscrollcommand')
+    tree.configure(yscrollcommand='')
+    try:
+        for iid, values in rows:
+            tree.insert('', 'end', iid=iid, values=values)
+    finally:
+        tree.configure(yscrollcommand=yscrollcommand)
+
+
+class _Row:
+    """
+    Adapter AttachmentInfo -> wartości wiersza Treeview
+
+    Teksty są liczone dopiero przy wstawianiu wiersza (porcjami, patrz
+    AttachmentsWidget._materialize_rows), a lista plików jest ucinana -
+    kolumna i tak nie pokaże więcej.
+    """
+
+    # Maksymalna długość tekstu listy plików w kolumnie 'files'
+    FILES_STR_MAX_LEN = 80
+
+    def __init__(self, attachment):
+        self.attachment = attachment
+
+    @cached_property
+    def files_str(self) -> str:
+        files_metadata = self.attachment.files_metadata
+        names = []
+        length = 0
+        for file_meta in files_metadata:
+            names.append(file_meta.filename)
+            length += len(file_meta.filename) + 2
+            if length > self.FILES_STR_MAX_LEN:
+                break
+
+        text = ", ".join(names)
+        if len(names) < len(files_metadata) or len(text) > self.FILES_STR_MAX_LEN:
+            text = text[:self.FILES_STR_MAX_LEN - 1] + "…"
+        return text
+
+    @cached_property
+    def size_str(self) -> str:
+        return format_file_size(self.attachment.total_size)
+
+    @property
+    def values(self) -> tuple:
+        created_at = self.attachment.created_at
+        return (
+            self.files_str,
+            self.size_str,
+            created_at[:10] if created_at else '',
+            self.attachment.notes or ''
+        )
+
+
 class AttachmentsWidget(ctk.CTkFrame):
     """
     Widget do zarządzania załącznikami w dialogu oferty/zamówienia
     Można łatwo dodać do istniejących dialogów
     """
 
+    # Styl ttk jest globalny dla interpretera Tk - wystarczy skonfigurować go raz
+    _style_initialized = False
+
+    # Liczba wierszy wstawianych do Treeview na raz
+    ROWS_PAGE_SIZE = 50
+
+    # iid wiersza "Ładowanie..." (pozostałe wiersze mają iid = ID załącznika)
+    _LOADING_IID = '__loading__'
+
     def __init__(
         self,
         parent,
@@ -38,6 +221,21 @@ class AttachmentsWidget(ctk.CTkFrame):
         self.entity_id = entity_id
         self.attachments_manager = AttachmentsManager(db_client)
 
+        # Numer bieżącego żądania ładowania - odrzuca spóźnione odpowiedzi
+        self._load_seq = 0
+
+        # Cache list plików per attachment_id (czyszczony przy przeładowaniu)
+        self._files_list_cache = {}
+
+        # Odświeżanie listy z opóźnieniem - seria zmian daje jedno zapytanie
+        self._reload_pending = False
+        self._reload_timer = None
+
+        # Pełna lista załączników; do Treeview trafia tylko przewinięta część
+        self._all_attachments = []
+        self._materialized_count = 0
+        self._materialize_scheduled = False
+
         self.setup_ui()
 
         # Załaduj załączniki jeśli entity_id jest podane
@@ -54,7 +252,7 @@ class AttachmentsWidget(ctk.CTkFrame):
         ctk.CTkLabel(
             header_frame,
             text="📎 Załączniki",
-            font=ctk.CTkFont(size=16, weight="bold")
+            font=_font(16, "bold")
         ).pack(side="left", padx=10)
 
         # Przyciski
@@ -114,11 +312,11 @@ class AttachmentsWidget(ctk.CTkFrame):
         self.tree.column('notes', width=200)
 
         # Scrollbar
-        scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        self._scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self._on_tree_yscroll)
 
         self.tree.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
+        self._scrollbar.pack(side="right", fill="y")
 
         # Bind podwójne kliknięcie do podglądu
         self.tree.bind("<Double-1>", lambda e: self.preview_file())
@@ -127,17 +325,24 @@ class AttachmentsWidget(ctk.CTkFrame):
         self.info_label = ctk.CTkLabel(
             self,
             text="Brak załączników",
-            font=ctk.CTkFont(size=11)
+            font=_font(11)
         )
         self.info_label.pack(pady=5)
 
-        # Styl dla treeview
+        # Styl dla treeview (konfigurowany raz na proces)
+        if not AttachmentsWidget._style_initialized:
+            self._init_style()
+
+    @classmethod
+    def _init_style(cls):
+        """Konfiguruje styl Treeview (jednorazowo dla wszystkich instancji)"""
         style = ttk.Style()
         style.theme_use('clam')
         style.configure("Treeview", background="#212121", foreground="white",
                        fieldbackground="#212121", borderwidth=0)
         style.configure("Treeview.Heading", background="#313131", foreground="white")
         style.map('Treeview', background=[('selected', '#144870')])
+        cls._style_initialized = True
 
     def set_entity_id(self, entity_id: str):
         """
@@ -150,51 +355,157 @@ class AttachmentsWidget(ctk.CTkFrame):
         self.load_attachments()
 
     def load_attachments(self):
-        """Ładuje listę załączników z bazy"""
+        """Ładuje listę załączników z bazy (zapytania w wątku roboczym)"""
         if not self.entity_id:
             return
 
-        # Wyczyść listę
+        self._load_seq += 1
+        seq = self._load_seq
+        self._files_list_cache.clear()
+
+        # Placeholder na czas pobierania
+        self._all_attachments = []
+        self._materialized_count = 0
         self.tree.delete(*self.tree.get_children())
+        self.tree.insert('', 'end', iid=self._LOADING_IID, values=("Ładowanie...", '', '', ''))
+        self.info_label.configure(text="Ładowanie załączników...")
+
+        result_queue = queue.Queue()
+        threading.Thread(
+            target=self._fetch_attachments_async,
+            args=(seq, self.entity_type, self.entity_id, result_queue),
+            daemon=True
+        ).start()
+        self.after(50, self._poll_attachments, result_queue)
+
+    def _schedule_reload(self, delay_ms: int = 150):
+        """
+        Planuje odświeżenie listy - kolejne wywołania w oknie delay_ms
+        są łączone w jedno load_attachments()
+        """
+        self._reload_pending = True
+        if self._reload_timer is None:
+            self._reload_timer = self.after(delay_ms, self._flush_reload)
+
+    def _flush_reload(self):
+        """Wykonuje zaplanowane odświeżenie listy"""
+        self._reload_timer = None
+        if self._reload_pending:
+            self._reload_pending = False
+            self.load_attachments()
 
-        # Pobierz załączniki
-        attachments = self.attachments_manager.get_attachments_list(
-            self.entity_type,
-            self.entity_id
-        )
+    def _fetch_attachments_async(self, seq: int, entity_type: str, entity_id: str,
+                                 result_queue: queue.Queue):
+        """Pobiera załączniki z bazy (wątek roboczy, bez dostępu do Tk)"""
+        attachments = self.attachments_manager.get_attachments_list(entity_type, entity_id)
+        result_queue.put((seq, attachments))
 
-        # Dodaj do listy
-        for attachment in attachments:
-            # Formatuj listę plików
-            files_list = ", ".join([f['filename'] for f in attachment.files_metadata])
+    def _poll_attachments(self, result_queue: queue.Queue):
+        """Czeka na wynik pobierania w wątku Tk"""
+        if not self.winfo_exists():
+            return
 
-            # Formatuj rozmiar
-            size_str = format_file_size(attachment.total_size)
+        try:
+            seq, attachments = result_queue.get_nowait()
+        except queue.Empty:
+            self.after(50, self._poll_attachments, result_queue)
+            return
 
-            # Formatuj datę
-            date_str = attachment.created_at[:10] if attachment.created_at else ''
+        # Odrzuć wynik nieaktualnego żądania
+        if seq != self._load_seq:
+            return
+
+        self._apply_attachments(attachments)
+
+    def _apply_attachments(self, attachments: list):
+        """
+        Wypełnia listę załączników (tylko w wątku Tk)
+
+        Wiersze są wstawiane porcjami - kolejna porcja dopiero gdy widok
+        zbliży się do końca listy (patrz _on_tree_yscroll).
+
+        Args:
+            attachments: Lista AttachmentInfo
+        """
+        # Wyczyść listę
+        self.tree.delete(*self.tree.get_children())
+
+        self._all_attachments = attachments
+        self._materialized_count = 0
 
-            self.tree.insert('', 'end',
-                           values=(
-                               files_list,
-                               size_str,
-                               date_str,
-                               attachment.notes or ''
-                           ),
-                           tags=(attachment.id,))
+        # Metadane plików są już w pamięci - podgląd nie musi pytać bazy
+        for attachment in attachments:
+            self._files_list_cache[attachment.id] = attachment.files_metadata
+
+        self._materialize_rows()
 
         # Aktualizuj info label
         if attachments:
-            summary = self.attachments_manager.get_attachment_size_summary(
-                self.entity_type,
-                self.entity_id
-            )
-            info_text = f"{summary['files_count']} plików w {summary['attachments_count']} archiwach | "
-            info_text += f"Razem: {format_file_size(summary['total_size'])}"
+            # Podsumowanie liczone z pobranej listy - bez dodatkowego zapytania
+            files_count = sum(len(a.files_metadata) for a in attachments)
+            total_size = sum(a.total_size for a in attachments)
+            info_text = f"{files_count} plików w {len(attachments)} archiwach | "
+            info_text += f"Razem: {format_file_size(total_size)}"
             self.info_label.configure(text=info_text)
         else:
             self.info_label.configure(text="Brak załączników")
 
+    def _materialize_rows(self):
+        """Wstawia do Treeview kolejną porcję wierszy z self._all_attachments"""
+        self._materialize_scheduled = False
+
+        start = self._materialized_count
+        end = min(start + self.ROWS_PAGE_SIZE, len(self._all_attachments))
+        if start >= end:
+            return
+
+        # Przygotuj wiersze, potem wstaw je jednym ciągiem
+        rows = [
+            (attachment.id, _Row(attachment).values)
+            for attachment in self._all_attachments[start:end]
+        ]
+
+        self._materialized_count = end
+        _bulk_insert(self.tree, rows)
+
+    def _on_tree_yscroll(self, first, last):
+        """
+        yscrollcommand Treeview - aktualizuje scrollbar i dociąga kolejną
+        porcję wierszy, gdy widoczny jest koniec wstawionej części listy
+        """
+        self._scrollbar.set(first, last)
+
+        if (float(last) >= 0.9
+                and not self._materialize_scheduled
+                and self._materialized_count < len(self._all_attachments)):
+            self._materialize_scheduled = True
+            self.after_idle(self._materialize_rows)
+
+    def _cached_files_list(self, attachment_id: str) -> list:
+        """
+        Zwraca listę plików załącznika, pobierając ją z bazy tylko raz
+
+        Args:
+            attachment_id: ID załącznika
+
+        Returns:
+            Lista FileMetadata
+        """
+        files_list = self._files_list_cache.get(attachment_id)
+        if files_list is None:
+            files_list = self.attachments_manager.get_files_list(attachment_id)
+            if files_list:
+                self._files_list_cache[attachment_id] = files_list
+        return files_list
+
+    def _get_selected_attachment_id(self):
+        """Zwraca ID zaznaczonego załącznika lub None (np. dla wiersza 'Ładowanie...')"""
+        # iid wiersza = ID załącznika - bez odczytu danych wiersza z Tcl
+        selection = self.tree.selection()
+        if not selection or selection[0] == self._LOADING_IID:
+            return None
+        return selection[0]
+
     def add_files(self):
         """Dodaje pliki jako załącznik z obsługą większej liczby formatów"""
         if not self.entity_id:
@@ -207,32 +518,21 @@ class AttachmentsWidget(ctk.CTkFrame):
         # Dialog wyboru plików z rozszerzoną listą formatów
         file_paths = filedialog.askopenfilenames(
             title="Wybierz pliki do dodania",
-            filetypes=[
-                ("Wszystkie pliki", "*.*"),
-                ("PDF", "*.pdf"),
-                ("Word", "*.doc;*.docx"),
-                ("Excel", "*.xls;*.xlsx"),
-                ("PowerPoint", "*.ppt;*.pptx"),
-                ("Obrazy", "*.png;*.jpg;*.jpeg;*.gif;*.bmp;*.svg"),
-                ("CAD 2D", "*.dxf;*.dwg"),
-                ("CAD 3D", "*.step;*.stp;*.igs;*.iges"),
-                ("Tekst", "*.txt;*.csv"),
-                ("Archiwa", "*.zip;*.rar;*.7z")
-            ]
+            filetypes=_ADD_FILES_FILETYPES
         )
 
         if not file_paths:
             return
 
         # Sprawdź rozmiar plików
-        total_size = sum(os.path.getsize(f) for f in file_paths)
         max_size = 50 * 1024 * 1024  # 50MB
+        total_size = _selection_total_size(file_paths, max_size)
 
         if total_size > max_size:
             from attachments_manager import format_file_size
             messagebox.showwarning(
                 "Przekroczony rozmiar",
-                f"Suma rozmiarów plików ({format_file_size(total_size)}) "
+                f"Suma rozmiarów plików (co najmniej {format_file_size(total_size)}) "
                 f"przekracza limit {format_file_size(max_size)}.\n\n"
                 f"Proszę wybrać mniej plików lub pliki o mniejszym rozmiarze."
             )
@@ -241,41 +541,95 @@ class AttachmentsWidget(ctk.CTkFrame):
         # Poproś o notatki (opcjonalne)
         notes = self.ask_notes()
 
-        # Pokaż informację o procesie uploadu dla dużych plików
-        if total_size > 5 * 1024 * 1024:  # Powyżej 5MB
-            messagebox.showinfo(
-                "Dodawanie plików",
-                f"Trwa dodawanie {len(file_paths)} plików.\n"
-                f"Może to potrwać kilka chwil dla dużych plików."
-            )
+        # Upload w wątku roboczym - pętla Tk pozostaje responsywna
+        self._start_upload(list(file_paths), notes, total_size)
+
+    def _start_upload(self, file_paths: list, notes: str, total_size: int):
+        """
+        Uruchamia upload plików w wątku roboczym z oknem postępu
 
-        # Dodaj pliki
-        result = self.attachments_manager.add_files(
-            entity_type=self.entity_type,
-            entity_id=self.entity_id,
-            file_paths=list(file_paths),
-            notes=notes
+        Args:
+            file_paths: Lista ścieżek do plików
+            notes: Notatki do załącznika
+            total_size: Łączny rozmiar plików w bajtach
+        """
+        progress_queue = queue.Queue()
+        cancel_event = threading.Event()
+        progress_dialog = UploadProgressDialog(
+            self,
+            files_count=len(file_paths),
+            total_size=total_size,
+            on_cancel=cancel_event.set
         )
 
-        if result:
-            messagebox.showinfo("Sukces", f"Dodano {len(file_paths)} plików jako załącznik")
-            self.load_attachments()
-        else:
-            messagebox.showerror("Błąd", "Nie udało się dodać załączników")
+        def upload_worker():
+            try:
+                result = self.attachments_manager.add_files(
+                    entity_type=self.entity_type,
+                    entity_id=self.entity_id,
+                    file_paths=file_paths,
+                    notes=notes,
+                    progress_callback=lambda done, total: progress_queue.put(('progress', done, total)),
+                    cancel_event=cancel_event
+                )
+            except Exception as e:
+                print(f"❌ Błąd uploadu załączników: {e}")
+                result = None
+            progress_queue.put(('done', result))
+
+        threading.Thread(target=upload_worker, daemon=True).start()
+        self.after(100, self._poll_upload_progress, progress_queue, progress_dialog,
+                   cancel_event, len(file_paths))
+
+    def _poll_upload_progress(self, progress_queue, progress_dialog, cancel_event, files_count):
+        """Opróżnia kolejkę postępu uploadu w wątku Tk i aktualizuje okno postępu"""
+        if not self.winfo_exists():
+            return
+
+        try:
+            while True:
+                event = progress_queue.get_nowait()
+                if event[0] == 'progress':
+                    progress_dialog.update_progress(event[1], event[2])
+                    continue
+
+                # Upload zakończony
+                result = event[1]
+                if progress_dialog.winfo_exists():
+                    progress_dialog.destroy()
+
+                if cancel_event.is_set():
+                    if result:
+                        # Anulowanie dotarło już po zapisie załącznika
+                        messagebox.showinfo(
+                            "Anulowano za późno",
+                            f"Załącznik ({files_count} plików) został już zapisany przed anulowaniem"
+                        )
+                        self._schedule_reload()
+                    else:
+                        messagebox.showinfo("Anulowano", "Dodawanie załączników zostało anulowane")
+                elif result:
+                    messagebox.showinfo("Sukces", f"Dodano {files_count} plików jako załącznik")
+                    self._schedule_reload()
+                else:
+                    messagebox.showerror("Błąd", "Nie udało się dodać załączników")
+                return
+        except queue.Empty:
+            pass
+
+        self.after(100, self._poll_upload_progress, progress_queue, progress_dialog,
+                   cancel_event, files_count)
 
     def preview_file(self):
         """Podgląd wybranego pliku"""
-        selection = self.tree.selection()
-        if not selection:
+        # Pobierz ID załącznika
+        attachment_id = self._get_selected_attachment_id()
+        if not attachment_id:
             messagebox.showwarning("Uwaga", "Wybierz załącznik do podglądu")
             return
 
-        # Pobierz ID załącznika
-        item = self.tree.item(selection[0])
-        attachment_id = item['tags'][0]
-
         # Pobierz listę plików w załączniku
-        files_list = self.attachments_manager.get_files_list(attachment_id)
+        files_list = self._cached_files_list(attachment_id)
 
         if not files_list:
             messagebox.showwarning("Uwaga", "Brak plików w załączniku")
@@ -296,17 +650,14 @@ class AttachmentsWidget(ctk.CTkFrame):
 
     def download_file(self):
         """Pobiera (eksportuje) wybrany plik"""
-        selection = self.tree.selection()
-        if not selection:
+        # Pobierz ID załącznika
+        attachment_id = self._get_selected_attachment_id()
+        if not attachment_id:
             messagebox.showwarning("Uwaga", "Wybierz załącznik do pobrania")
             return
 
-        # Pobierz ID załącznika
-        item = self.tree.item(selection[0])
-        attachment_id = item['tags'][0]
-
         # Pobierz listę plików
-        files_list = self.attachments_manager.get_files_list(attachment_id)
+        files_list = self._cached_files_list(attachment_id)
 
         if not files_list:
             messagebox.showwarning("Uwaga", "Brak plików w załączniku")
@@ -318,7 +669,7 @@ class AttachmentsWidget(ctk.CTkFrame):
             return
 
         # Jeśli jest więcej plików, rozpakuj wszystkie
-        temp_dir = self.attachments_manager.extract_all_to_temp(attachment_id)
+        temp_dir = self.attachments_manager.extract_all_to_temp_parallel(attachment_id)
         if temp_dir:
             # Otwórz folder w eksploratorze
             self._open_folder(temp_dir)
@@ -330,23 +681,35 @@ class AttachmentsWidget(ctk.CTkFrame):
 
     def delete_attachment(self):
         """Usuwa wybrany załącznik"""
-        selection = self.tree.selection()
-        if not selection:
+        # Pobierz ID załącznika
+        attachment_id = self._get_selected_attachment_id()
+        if not attachment_id:
             messagebox.showwarning("Uwaga", "Wybierz załącznik do usunięcia")
             return
 
-        # Potwierdź usunięcie
-        if not messagebox.askyesno("Potwierdzenie", "Czy na pewno usunąć załącznik?"):
-            return
+        # Potwierdź usunięcie (okno wielokrotnego użytku, Enter = Tak)
+        ConfirmDialog.ask(
+            self,
+            "Potwierdzenie",
+            "Czy na pewno usunąć załącznik?",
+            lambda: self._delete_attachment_confirmed(attachment_id)
+        )
 
-        # Pobierz ID załącznika
-        item = self.tree.item(selection[0])
-        attachment_id = item['tags'][0]
+    def _delete_attachment_confirmed(self, attachment_id: str):
+        """
+        Usuwa załącznik po potwierdzeniu
+
+        Args:
+            attachment_id: ID załącznika do usunięcia
+        """
+        if not self.winfo_exists():
+            return
 
         # Usuń załącznik
+        self._files_list_cache.pop(attachment_id, None)
         if self.attachments_manager.delete_attachment(attachment_id):
             messagebox.showinfo("Sukces", "Załącznik został usunięty")
-            self.load_attachments()
+            self._schedule_reload()
         else:
             messagebox.showerror("Błąd", "Nie udało się usunąć załącznika")
 
@@ -370,9 +733,6 @@ class AttachmentsWidget(ctk.CTkFrame):
             # Sprawdź czy plik może być podglądany
             can_preview = self.attachments_manager.can_preview_file(filename)
 
-            # Sprawdź czy system ma aplikację do otwarcia tego typu pliku
-            has_app = self.attachments_manager.has_default_application(filename)
-
             if not can_preview:
                 # Plik nie może być podglądany
                 response = messagebox.askyesno(
@@ -384,6 +744,10 @@ class AttachmentsWidget(ctk.CTkFrame):
                     self._download_single_file(attachment_id, filename)
                 return
 
+            # Sprawdź czy system ma aplikację do otwarcia tego typu pliku
+            # (wynik zapamiętywany per rozszerzenie w AttachmentsStorage)
+            has_app = self.attachments_manager.has_default_application(filename)
+
             if not has_app:
                 # System nie ma domyślnej aplikacji
                 ext = os.path.splitext(filename)[1]
@@ -396,28 +760,20 @@ class AttachmentsWidget(ctk.CTkFrame):
                 if not response:
                     return
 
-            # Wyodrębnij plik
-            file_data = self.attachments_manager.extract_file(attachment_id, filename)
-            if not file_data:
-                messagebox.showerror("Błąd", f"Nie udało się otworzyć pliku: {filename}")
-                return
-
-            # Zapisz do pliku tymczasowego
-            temp_file = tempfile.NamedTemporaryFile(
-                delete=False,
+            # Wyodrębnij plik bezpośrednio do pliku tymczasowego
+            import tempfile
+            fd, temp_path = tempfile.mkstemp(
                 suffix=os.path.splitext(filename)[1],
                 prefix=os.path.splitext(filename)[0] + "_"
             )
-            temp_file.write(file_data)
-            temp_file.close()
+
+            if not self.attachments_manager.extract_file_to_fd(attachment_id, filename, fd):
+                os.remove(temp_path)
+                messagebox.showerror("Błąd", f"Nie udało się otworzyć pliku: {filename}")
+                return
 
             # Otwórz w domyślnej aplikacji
-            if platform.system() == 'Windows':
-                os.startfile(temp_file.name)
-            elif platform.system() == 'Darwin':  # macOS
-                subprocess.call(['open', temp_file.name])
-            else:  # Linux
-                subprocess.call(['xdg-open', temp_file.name])
+            _open_native(temp_path)
 
             print(f"✅ Otwarto plik: {filename}")
 
@@ -443,16 +799,11 @@ class AttachmentsWidget(ctk.CTkFrame):
             if not save_path:
                 return
 
-            # Wyodrębnij plik
-            file_data = self.attachments_manager.extract_file(attachment_id, filename)
-            if not file_data:
+            # Wyodrębnij plik prosto do miejsca docelowego
+            if not self.attachments_manager.extract_file_to(attachment_id, filename, save_path):
                 messagebox.showerror("Błąd", "Nie udało się pobrać pliku")
                 return
 
-            # Zapisz plik
-            with open(save_path, 'wb') as f:
-                f.write(file_data)
-
             messagebox.showinfo("Sukces", f"Plik zapisany:\n{save_path}")
 
         except Exception as e:
@@ -466,16 +817,163 @@ class AttachmentsWidget(ctk.CTkFrame):
             folder_path: Ścieżka do folderu
         """
         try:
-            if platform.system() == 'Windows':
-                os.startfile(folder_path)
-            elif platform.system() == 'Darwin':  # macOS
-                subprocess.call(['open', folder_path])
-            else:  # Linux
-                subprocess.call(['xdg-open', folder_path])
+            _open_native(folder_path)
         except Exception as e:
             print(f"❌ Nie udało się otworzyć folderu: {e}")
 
 
+class ConfirmDialog(ctk.CTkToplevel):
+    """
+    Okno potwierdzenia tworzone raz i ukrywane między użyciami
+
+    Nie blokuje pętli Tk - decyzja trafia do callbacku.
+    Enter = Tak, Escape/zamknięcie okna = Nie. Pytania zadane, gdy okno
+    jest już otwarte, czekają w kolejce; po odpowiedzi grab wraca do okna,
+    które miało go wcześniej (np. modalny dialog zamówienia).
+    """
+
+    _instance = None
+
+    @classmethod
+    def ask(cls, parent, title: str, message: str, on_confirm):
+        """
+        Pokazuje (współdzielone) okno potwierdzenia
+
+        Args:
+            parent: Widget, nad którym ma się pojawić okno
+            title: Tytuł okna
+            message: Treść pytania
+            on_confirm: Callback wywoływany po potwierdzeniu
+        """
+        dialog = cls._instance
+        if dialog is None or not dialog.winfo_exists():
+            # Rodzicem jest główne okno - dialog przetrwa zamknięcie okna oferty/zamówienia
+            dialog = cls._instance = cls(parent._root())
+        if dialog._on_confirm is not None:
+            # Okno czeka na odpowiedź - nie nadpisuj poprzedniego pytania
+            dialog._pending.append((parent, title, message, on_confirm))
+            return
+        dialog._show(parent, title, message, on_confirm)
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.withdraw()
+
+        self._on_confirm = None
+        self._previous_grab = None
+        self._pending = deque()
+        self.resizable(False, False)
+
+        self.message_label = ctk.CTkLabel(self, text="", wraplength=320)
+        self.message_label.pack(padx=20, pady=(20, 10))
+
+        btn_frame = ctk.CTkFrame(self, fg_color="transparent")
+        btn_frame.pack(pady=(0, 15))
+
+        self.yes_button = ctk.CTkButton(
+            btn_frame,
+            text="Tak",
+            width=100,
+            command=lambda: self._answer(True)
+        )
+        self.yes_button.pack(side="left", padx=10)
+
+        ctk.CTkButton(
+            btn_frame,
+            text="Nie",
+            width=100,
+            command=lambda: self._answer(False)
+        ).pack(side="left", padx=10)
+
+        self.bind("<Return>", lambda e: self._answer(True))
+        self.bind("<Escape>", lambda e: self._answer(False))
+        self.protocol("WM_DELETE_WINDOW", lambda: self._answer(False))
+
+    def _show(self, parent, title: str, message: str, on_confirm):
+        """Aktualizuje treść i pokazuje okno"""
+        self._on_confirm = on_confirm
+        self.title(title)
+        self.message_label.configure(text=message)
+
+        self.transient(parent.winfo_toplevel())
+        self.deiconify()
+        self.lift()
+        # Zapamiętaj grab modalnego okna wywołującego, żeby go potem przywrócić
+        self._previous_grab = self.grab_current()
+        self.grab_set()
+        self.focus_set()
+
+    def _answer(self, confirmed: bool):
+        """Ukrywa okno, przywraca poprzedni grab i przekazuje decyzję"""
+        self.grab_release()
+        self.withdraw()
+
+        previous_grab, self._previous_grab = self._previous_grab, None
+        if previous_grab is not None and previous_grab is not self and previous_grab.winfo_exists():
+            previous_grab.grab_set()
+
+        callback, self._on_confirm = self._on_confirm, None
+        if confirmed and callback:
+            callback()
+
+        # Następne pytanie z kolejki (pomijane, jeśli jego okno już zamknięto)
+        while self._pending and self._on_confirm is None:
+            parent, title, message, on_confirm = self._pending.popleft()
+            if parent.winfo_exists():
+                self._show(parent, title, message, on_confirm)
+
+
+class UploadProgressDialog(ctk.CTkToplevel):
+    """Niemodalne okno postępu uploadu załączników z możliwością anulowania"""
+
+    def __init__(self, parent, files_count: int, total_size: int, on_cancel):
+        super().__init__(parent)
+
+        self.on_cancel = on_cancel
+
+        self.title("Dodawanie plików")
+        self.geometry("400x150")
+        self.resizable(False, False)
+        self.transient(parent)
+
+        ctk.CTkLabel(
+            self,
+            text=f"Trwa dodawanie {files_count} plików ({format_file_size(total_size)})",
+            font=_font(13, "bold")
+        ).pack(pady=(15, 5))
+
+        self.progress_bar = ctk.CTkProgressBar(self, width=340)
+        self.progress_bar.set(0)
+        self.progress_bar.pack(pady=5)
+
+        self.status_label = ctk.CTkLabel(self, text="Przygotowywanie...")
+        self.status_label.pack(pady=2)
+
+        self.cancel_button = ctk.CTkButton(
+            self,
+            text="Anuluj",
+            width=120,
+            command=self.cancel
+        )
+        self.cancel_button.pack(pady=5)
+
+        self.protocol("WM_DELETE_WINDOW", self.cancel)
+
+    def update_progress(self, bytes_done: int, bytes_total: int):
+        """Aktualizuje pasek postępu (wywoływane w wątku Tk)"""
+        fraction = bytes_done / bytes_total if bytes_total else 1.0
+        self.progress_bar.set(fraction)
+        self.status_label.configure(
+            text=f"{format_file_size(bytes_done)} / {format_file_size(bytes_total)}"
+        )
+
+    def cancel(self):
+        """Zgłasza anulowanie - upload przerwie się przed kolejnym plikiem"""
+        self.on_cancel()
+        self.cancel_button.configure(state="disabled")
+        self.status_label.configure(text="Anulowanie...")
+
+
 class FileSelectionDialog(ctk.CTkToplevel):
     """Dialog wyboru pliku z listy plików w załączniku"""
 
@@ -506,7 +1004,7 @@ class FileSelectionDialog(ctk.CTkToplevel):
         header = ctk.CTkLabel(
             self,
             text="Wybierz plik do otwarcia",
-            font=ctk.CTkFont(size=16, weight="bold")
+            font=_font(16, "bold")
         )
         header.pack(pady=10)
 
@@ -530,13 +1028,27 @@ class FileSelectionDialog(ctk.CTkToplevel):
         self.tree.column('size', width=100)
         self.tree.column('type', width=150)
 
-        # Dodaj pliki do listy
+        # Dodaj pliki do listy (ikona liczona raz na typ MIME)
+        icon_by_type = {}
+        rows = []
+        # iid wiersza -> nazwa pliku (iid musi być unikalny, nazwy mogą się powtarzać)
+        self._filename_by_iid = {}
         for file_meta in self.files_list:
-            icon = get_file_icon_by_type(file_meta.type)
+            icon = icon_by_type.get(file_meta.type)
+            if icon is None:
+                icon = icon_by_type[file_meta.type] = get_file_icon_by_type(file_meta.type)
             size_str = format_file_size(file_meta.size)
 
-            self.tree.insert('', 'end',
-                           values=(icon, file_meta.filename, size_str, file_meta.type))
+            iid = file_meta.filename
+            suffix = 1
+            while iid in self._filename_by_iid:
+                suffix += 1
+                iid = f"{file_meta.filename}#{suffix}"
+            self._filename_by_iid[iid] = file_meta.filename
+
+            rows.append((iid, (icon, file_meta.filename, size_str, file_meta.type)))
+
+        _bulk_insert(self.tree, rows)
 
         # Scrollbar
         scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.tree.yview)
@@ -572,8 +1084,7 @@ class FileSelectionDialog(ctk.CTkToplevel):
         if not selection:
             return
 
-        item = self.tree.item(selection[0])
-        filename = item['values'][1]
+        filename = self._filename_by_iid[selection[0]]
 
         self.destroy()
         self.on_select_callback(filename)
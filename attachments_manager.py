@@ -6,18 +6,96 @@ Zarządzanie załącznikami z obsługą Supabase Storage i kompatybilnością ws
 """
 
 import os
-import io
-import zipfile
 import json
+import shutil
+import hashlib
 import tempfile
-import mimetypes
-from typing import List, Dict, Optional, Tuple, BinaryIO
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple, BinaryIO, Callable
 from pathlib import Path
 from dataclasses import dataclass, asdict
 from datetime import datetime
 
 # Import modułu Supabase Storage
-from attachments_storage import AttachmentsStorage, get_file_icon_by_extension
+from attachments_storage import AttachmentsStorage, get_file_icon_by_extension, guess_mime_type
+
+# Opcjonalnie szybszy parser JSON dla files_metadata
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Komunikaty modułu - budowane tylko gdy poziom logowania jest włączony
+logger = logging.getLogger('AttachmentsManager')
+
+
+# Jednostki rozmiaru dla _format_size (kolejne potęgi 1024)
+_SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
+
+
+def _content_hash(file_obj: BinaryIO) -> str:
+    """
+    Zwraca skrót treści pliku używany do deduplikacji w storage
+
+    Plik czytany jest blokami po 1 MB, a na końcu przewijany na początek.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for chunk in iter(lambda: file_obj.read(1 << 20), b''):
+        digest.update(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+
+def _json_loads(raw):
+    """Parsuje JSON (str lub bytes) - orjson jeśli dostępny, inaczej json"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _files_metadata_list(raw) -> List[Dict]:
+    """
+    Zwraca files_metadata jako listę słowników
+
+    Kolumna jsonb (migration_attachments_files_metadata_jsonb.sql) przychodzi
+    z PostgREST już sparsowana; napis JSON zostaje tylko w niezmigrowanej bazie.
+    Surowe bytes trafiają do orjson bez dekodowania do str.
+    """
+    if isinstance(raw, (str, bytes, bytearray)):
+        return _json_loads(raw) if raw else []
+    return raw or []
+
+
+def _is_missing_function_error(error: Exception) -> bool:
+    """
+    Sprawdza, czy błąd RPC oznacza brak funkcji w bazie
+
+    PostgREST zgłasza PGRST202 (funkcja nie w cache schematu), a PostgreSQL
+    42883 / "function ... does not exist".
+    """
+    code = getattr(error, 'code', None)
+    if code in ('PGRST202', '42883'):
+        return True
+    message = str(error)
+    return 'PGRST202' in message or ('function' in message and 'does not exist' in message)
+
+
+def _is_missing_table_error(error: Exception) -> bool:
+    """
+    Sprawdza, czy błąd zapytania oznacza brak tabeli w bazie
+
+    PostgREST zgłasza PGRST205 (tabela nie w cache schematu), a PostgreSQL
+    42P01 / "relation ... does not exist".
+    """
+    code = getattr(error, 'code', None)
+    if code in ('PGRST205', '42P01'):
+        return True
+    message = str(error)
+    return 'PGRST205' in message or ('relation' in message and 'does not exist' in message)
 
 
 @dataclass
@@ -55,6 +133,13 @@ class AttachmentInfo:
 class AttachmentsManager:
     """Manager do obsługi załączników z Supabase Storage i kompatybilnością wsteczną"""
 
+    # Liczba wątków rozpakowujących/pobierających pliki w extract_all_to_temp_parallel
+    EXTRACT_WORKERS = 4
+    # Liczba równoległych uploadów w add_files
+    UPLOAD_WORKERS = 4
+    # Liczba załączników, których metadane trzyma cache LRU (_fetch_metadata)
+    METADATA_CACHE_SIZE = 256
+
     def __init__(self, db_client):
         """
         Inicjalizacja managera załączników
@@ -65,6 +150,14 @@ class AttachmentsManager:
         self.client = db_client
         # Inicjalizacja storage manager dla Supabase Storage
         self.storage = AttachmentsStorage(db_client)
+        # Pula wątków współdzielona przez kolejne wywołania (tworzona przy pierwszym użyciu)
+        self._extract_executor = None
+        self._upload_executor = None
+        # Cache LRU: attachment_id -> (storage_type, files_metadata, filename -> storage_path)
+        self._metadata_cache: 'OrderedDict[str, Tuple[str, List[Dict], Dict[str, str]]]' = OrderedDict()
+        self._metadata_lock = threading.Lock()
+        # Deduplikacja treści - wyłączana, gdy brak tabeli attachment_blobs
+        self._dedup_available = True
 
     def add_files(
         self,
@@ -72,17 +165,27 @@ class AttachmentsManager:
         entity_id: str,
         file_paths: List[str],
         created_by: Optional[str] = None,
-        notes: Optional[str] = None
+        notes: Optional[str] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        cancel_event: Optional[threading.Event] = None
     ) -> Optional[Dict]:
         """
         Dodaje pliki do Supabase Storage
 
+        Pliki są wysyłane równolegle (UPLOAD_WORKERS wątków); jeśli upload
+        któregoś z nich się nie powiedzie, pozostałe są usuwane ze storage.
+
         Args:
             entity_type: Typ encji ('order' lub 'quotation')
             entity_id: ID zamówienia lub oferty
             file_paths: Lista ścieżek do plików
             created_by: Użytkownik tworzący załącznik
             notes: Dodatkowe notatki
+            progress_callback: Opcjonalny callback (bytes_done, bytes_total)
+                wywoływany po uploadzie każdego pliku (z wątku roboczego)
+            cancel_event: Opcjonalne zdarzenie przerwania - sprawdzane przed
+                każdym plikiem i przed zapisem do bazy; już wysłane pliki
+                są usuwane ze storage
 
         Returns:
             Dict z informacjami o utworzonym załączniku lub None w przypadku błędu
@@ -95,91 +198,289 @@ class AttachmentsManager:
             if not file_paths:
                 raise ValueError("Lista plików nie może być pusta")
 
-            # Sprawdź czy pliki istnieją
+            # Sprawdź czy pliki istnieją - jeden stat na plik daje też rozmiar do postępu
+            bytes_total = 0
             for file_path in file_paths:
-                if not os.path.exists(file_path):
-                    raise FileNotFoundError(f"Plik nie istnieje: {file_path}")
+                try:
+                    bytes_total += os.stat(file_path).st_size
+                except FileNotFoundError:
+                    raise FileNotFoundError(f"Plik nie istnieje: {file_path}") from None
+            # Wspólny czas dodania dla całej paczki plików
+            added_at = datetime.now().isoformat()
+
+            if self._upload_executor is None:
+                self._upload_executor = ThreadPoolExecutor(max_workers=self.UPLOAD_WORKERS)
+
+            progress_lock = threading.Lock()
+            bytes_done = 0
+
+            def upload_one(file_path: str) -> Optional[Tuple[FileMetadata, bool]]:
+                nonlocal bytes_done
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
 
-            files_metadata = []
-            total_size = 0
+                result = self._upload_single_file(file_path, entity_type, entity_id, added_at)
+
+                if progress_callback:
+                    with progress_lock:
+                        bytes_done += result[0].size
+                        progress_callback(bytes_done, bytes_total)
+                return result
+
+            # Upload plików do Supabase Storage - równolegle (sieć zwalnia GIL)
+            futures = [self._upload_executor.submit(upload_one, p) for p in file_paths]
+            results = []
+            upload_error = None
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    upload_error = upload_error or e
+
+            uploaded_paths = [
+                result[0].storage_path for result in results
+                if result is not None and result[1]
+            ]
+
+            if upload_error is not None:
+                self._discard_uploaded(uploaded_paths)
+                raise upload_error
+
+            # Anulowanie mogło przyjść już po starcie wszystkich uploadów -
+            # sprawdź ponownie przed zapisem wiersza do bazy
+            cancelled = cancel_event is not None and cancel_event.is_set()
+            if cancelled or any(result is None for result in results):
+                self._discard_uploaded(uploaded_paths)
+                logger.info("ℹ️ Anulowano dodawanie załączników")
+                return None
 
-            # Upload każdego pliku do Supabase Storage
-            for file_path in file_paths:
-                with open(file_path, 'rb') as f:
-                    file_data = f.read()
+            files_metadata = [result[0] for result in results]
+            total_size = sum(metadata.size for metadata in files_metadata)
 
-                filename = os.path.basename(file_path)
-                file_size = len(file_data)
+            # Konwertuj metadane do JSON
+            metadata_json = [m.to_dict() for m in files_metadata]
 
-                # Określ MIME type
-                mime_type, _ = mimetypes.guess_type(filename)
-                if not mime_type:
-                    mime_type = 'application/octet-stream'
+            # Zapisz do bazy bez archive_data
+            attachment_data = {
+                'entity_type': entity_type,
+                'entity_id': entity_id,
+                'archive_data': None,  # NIE PRZECHOWUJEMY JUŻ BYTEA
+                'files_metadata': metadata_json,  # jsonb - bez serializacji do napisu
+                'total_size': total_size,
+                'compressed_size': 0,  # Brak kompresji
+                'files_count': len(file_paths),
+                'created_by': created_by,
+                'notes': notes,
+                'storage_type': 'supabase_storage'  # Nowe pole oznaczające typ przechowywania
+            }
+
+            response = self.client.table('attachments').insert(attachment_data).execute()
 
+            if response.data:
+                logger.info("✅ Dodano załącznik: %d plików, rozmiar: %s",
+                            len(file_paths), self._format_size(total_size))
+                return response.data[0]
+
+            return None
+
+        except Exception as e:
+            logger.error("❌ Błąd dodawania załączników: %s", e)
+            return None
+
+    def _upload_single_file(
+        self,
+        file_path: str,
+        entity_type: str,
+        entity_id: str,
+        added_at: str
+    ) -> Tuple[FileMetadata, bool]:
+        """
+        Wysyła jeden plik do Supabase Storage (wywoływane z wątków add_files)
+
+        Args:
+            file_path: Ścieżka do pliku
+            entity_type: Typ encji ('order' lub 'quotation')
+            entity_id: ID zamówienia lub oferty
+            added_at: Czas dodania paczki plików
+
+        Returns:
+            Tuple (metadane pliku, True jeśli plik został wysłany w tym wywołaniu
+            - False gdy wskazuje istniejący obiekt po deduplikacji)
+        """
+        filename = os.path.basename(file_path)
+
+        # Określ MIME type
+        mime_type = guess_mime_type(filename)
+
+        # Plik wysyłany strumieniowo - do pamięci trafia tylko obraz na thumbnail
+        with open(file_path, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+
+            # Ta sama treść jest już w storage - wskaż istniejący obiekt
+            content_hash = _content_hash(f)
+            storage_path = self._find_blob(content_hash)
+            uploaded = storage_path is None
+
+            if storage_path:
+                logger.info("ℹ️ Plik %s jest już w storage - pominięto upload", filename)
+            else:
                 # Upload do storage
                 upload_result = self.storage.upload_file(
-                    file_data=file_data,
+                    file_data=f,
                     filename=filename,
                     entity_type=entity_type,
                     entity_id=entity_id,
-                    file_category='attachments'
+                    file_category='attachments',
+                    sign_url=False,  # URL generowany na żądanie (get_signed_url_for_file)
+                    content_hash=content_hash  # bez drugiego czytania pliku dla ścieżki
                 )
 
                 if not upload_result:
                     raise Exception(f"Nie udało się uploadować pliku: {filename}")
 
-                # Zapisz metadane z storage_path
-                metadata = FileMetadata(
-                    filename=filename,
-                    size=file_size,
-                    type=mime_type,
-                    added_at=datetime.now().isoformat(),
-                    storage_path=upload_result['storage_path']
-                )
-                files_metadata.append(metadata)
-                total_size += file_size
+                storage_path = upload_result['storage_path']
+                self._register_blob(content_hash, storage_path, file_size)
 
                 # Opcjonalnie: generuj thumbnail dla obrazów
                 if mime_type and mime_type.startswith('image/'):
+                    f.seek(0)
                     thumb_result = self.storage.generate_thumbnail(
-                        file_data=file_data,
+                        file_data=f,
                         filename=filename,
                         entity_type=entity_type,
                         entity_id=entity_id
                     )
                     if thumb_result:
-                        print(f"✅ Wygenerowano thumbnail dla: {filename}")
-
-            # Konwertuj metadane do JSON
-            metadata_json = [m.to_dict() for m in files_metadata]
+                        logger.info("✅ Wygenerowano thumbnail dla: %s", filename)
+
+        metadata = FileMetadata(
+            filename=filename,
+            size=file_size,
+            type=mime_type,
+            added_at=added_at,
+            storage_path=storage_path
+        )
+        return metadata, uploaded
+
+    def _discard_uploaded(self, storage_paths: List[str]):
+        """
+        Usuwa ze storage pliki wysłane przed przerwaniem add_files
 
-            # Zapisz do bazy bez archive_data
-            attachment_data = {
-                'entity_type': entity_type,
-                'entity_id': entity_id,
-                'archive_data': None,  # NIE PRZECHOWUJEMY JUŻ BYTEA
-                'files_metadata': json.dumps(metadata_json),
-                'total_size': total_size,
-                'compressed_size': 0,  # Brak kompresji
-                'files_count': len(file_paths),
-                'created_by': created_by,
-                'notes': notes,
-                'storage_type': 'supabase_storage'  # Nowe pole oznaczające typ przechowywania
-            }
+        Args:
+            storage_paths: Ścieżki plików wysłanych w tym wywołaniu
+                (bez plików wskazanych przez deduplikację)
+        """
+        self._delete_storage_paths(storage_paths)
 
-            response = self.client.table('attachments').insert(attachment_data).execute()
+    def _find_blob(self, content_hash: str) -> Optional[str]:
+        """
+        Szuka w storage pliku o tej samej treści
 
-            if response.data:
-                print(f"✅ Dodano załącznik: {len(file_paths)} plików, "
-                      f"rozmiar: {self._format_size(total_size)}")
-                return response.data[0]
+        Args:
+            content_hash: Skrót treści pliku
 
+        Returns:
+            storage_path istniejącego pliku lub None
+        """
+        if not self._dedup_available:
             return None
 
+        try:
+            response = self.client.table('attachment_blobs').select(
+                'storage_path'
+            ).eq('content_hash', content_hash).limit(1).execute()
         except Exception as e:
-            print(f"❌ Błąd dodawania załączników: {e}")
+            if _is_missing_table_error(e):
+                # Brak migracji - upload bez deduplikacji do końca sesji
+                self._dedup_available = False
+                logger.warning("⚠️ Deduplikacja załączników niedostępna (%s)", e)
+            else:
+                # Np. chwilowy błąd sieci - ten plik po prostu jest wysyłany
+                logger.warning("⚠️ Nie sprawdzono deduplikacji pliku: %s", e)
             return None
 
+        if response.data:
+            return response.data[0]['storage_path']
+        return None
+
+    def _register_blob(self, content_hash: str, storage_path: str, size: int):
+        """
+        Zapisuje treść wysłanego pliku do indeksu deduplikacji
+
+        Args:
+            content_hash: Skrót treści pliku
+            storage_path: Ścieżka pliku w storage
+            size: Rozmiar pliku w bajtach
+        """
+        if not self._dedup_available:
+            return
+
+        try:
+            self.client.table('attachment_blobs').insert({
+                'content_hash': content_hash,
+                'storage_path': storage_path,
+                'size': size
+            }).execute()
+        except Exception as e:
+            # Np. równoległy upload tej samej treści - plik i tak jest poprawny
+            logger.warning("⚠️ Nie zapisano pliku w indeksie deduplikacji: %s", e)
+
+    def _delete_storage_paths(self, storage_paths: List[str]):
+        """
+        Usuwa pliki ze storage wraz z ich wpisami w indeksie deduplikacji
+
+        Args:
+            storage_paths: Ścieżki plików do usunięcia
+        """
+        if not storage_paths:
+            return
+
+        # Jedno żądanie remove dla wszystkich plików zamiast DELETE per plik
+        if self.storage.delete_files(storage_paths):
+            logger.info("✅ Usunięto %d plików ze storage", len(storage_paths))
+
+        if self._dedup_available:
+            try:
+                self.client.table('attachment_blobs').delete().in_(
+                    'storage_path', storage_paths
+                ).execute()
+            except Exception as e:
+                logger.warning("⚠️ Nie usunięto wpisów deduplikacji: %s", e)
+
+    def _unshared_storage_paths(self, storage_paths: List[str], attachment_id: str) -> List[str]:
+        """
+        Odfiltrowuje ścieżki używane jeszcze przez inne załączniki
+
+        Po deduplikacji lub copy_attachments kilka załączników może wskazywać
+        ten sam plik w storage - taki plik nie może zostać usunięty.
+
+        Args:
+            storage_paths: Ścieżki plików usuwanego załącznika
+            attachment_id: ID usuwanego załącznika
+
+        Returns:
+            Ścieżki, które można bezpiecznie usunąć ze storage
+            (pusta lista, gdy nie da się tego sprawdzić)
+        """
+        if not storage_paths:
+            return []
+
+        try:
+            response = self.client.rpc('storage_paths_in_use', {
+                'p_paths': storage_paths,
+                'p_exclude_id': attachment_id
+            }).execute()
+        except Exception as e:
+            # Bez sprawdzenia plik może należeć do innego załącznika - zostaw go
+            logger.warning("⚠️ RPC storage_paths_in_use niedostępne (%s) - pliki pozostają w storage", e)
+            return []
+
+        in_use = set()
+        for row in response.data or []:
+            # SETOF text: PostgREST zwraca listę wartości lub obiektów
+            in_use.add(row if isinstance(row, str) else next(iter(row.values())))
+        return [path for path in storage_paths if path not in in_use]
+
     def get_attachments_list(
         self,
         entity_type: str,
@@ -196,18 +497,21 @@ class AttachmentsManager:
             Lista AttachmentInfo
         """
         try:
-            response = self.client.table('attachments').select('*').eq(
+            # Bez archive_data - lista nie potrzebuje archiwów starych załączników
+            response = self.client.table('attachments').select(
+                'id, entity_type, entity_id, files_metadata, total_size, compressed_size, '
+                'files_count, created_at, created_by, notes, storage_type'
+            ).eq(
                 'entity_type', entity_type
             ).eq('entity_id', entity_id).order('created_at', desc=True).execute()
 
             attachments = []
             for data in response.data:
                 # Parsuj metadane plików z JSON
-                files_metadata_raw = data.get('files_metadata', '[]')
-                if isinstance(files_metadata_raw, str):
-                    files_metadata_list = json.loads(files_metadata_raw)
-                else:
-                    files_metadata_list = files_metadata_raw
+                files_metadata_list = _files_metadata_list(data.get('files_metadata'))
+                self._remember_metadata(
+                    data['id'], data.get('storage_type') or 'bytea', files_metadata_list
+                )
 
                 files_metadata = [
                     FileMetadata.from_dict(m) for m in files_metadata_list
@@ -230,9 +534,91 @@ class AttachmentsManager:
             return attachments
 
         except Exception as e:
-            print(f"❌ Błąd pobierania listy załączników: {e}")
+            logger.error("❌ Błąd pobierania listy załączników: %s", e)
             return []
 
+    def _fetch_metadata(
+        self,
+        attachment_id: str
+    ) -> Optional[Tuple[str, List[Dict], Dict[str, str]]]:
+        """
+        Pobiera storage_type i files_metadata załącznika (z cache LRU)
+
+        Metadane nie zmieniają się po utworzeniu załącznika, więc kolejne
+        operacje na nim (lista -> podgląd -> pobranie) nie odpytują bazy.
+
+        Args:
+            attachment_id: ID załącznika
+
+        Returns:
+            Tuple (storage_type, lista metadanych plików, słownik
+            filename -> storage_path) lub None gdy brak załącznika
+        """
+        with self._metadata_lock:
+            cached = self._metadata_cache.get(attachment_id)
+            if cached is not None:
+                self._metadata_cache.move_to_end(attachment_id)
+                return cached
+
+        response = self.client.table('attachments').select(
+            'files_metadata, storage_type'
+        ).eq('id', attachment_id).execute()
+
+        if not response.data:
+            return None
+
+        data = response.data[0]
+        # Domyślnie bytea dla starych załączników
+        return self._remember_metadata(
+            attachment_id,
+            data.get('storage_type') or 'bytea',
+            _files_metadata_list(data.get('files_metadata'))
+        )
+
+    def _remember_metadata(
+        self,
+        attachment_id: str,
+        storage_type: str,
+        files_metadata_list: List[Dict]
+    ) -> Tuple[str, List[Dict], Dict[str, str]]:
+        """Zapisuje metadane załącznika (z indeksem po nazwie pliku) w cache LRU i zwraca je"""
+        # Przy powtórzonej nazwie wygrywa pierwszy plik - jak przy przeszukiwaniu listy
+        storage_paths = {}
+        for file_meta in files_metadata_list:
+            if file_meta.get('storage_path'):
+                storage_paths.setdefault(file_meta['filename'], file_meta['storage_path'])
+
+        entry = (storage_type, files_metadata_list, storage_paths)
+        with self._metadata_lock:
+            self._metadata_cache[attachment_id] = entry
+            self._metadata_cache.move_to_end(attachment_id)
+            if len(self._metadata_cache) > self.METADATA_CACHE_SIZE:
+                self._metadata_cache.popitem(last=False)
+        return entry
+
+    def _forget_metadata(self, attachment_id: str):
+        """Usuwa metadane załącznika z cache (po usunięciu załącznika)"""
+        with self._metadata_lock:
+            self._metadata_cache.pop(attachment_id, None)
+
+    def _fetch_archive_data(self, attachment_id: str) -> Optional[bytes]:
+        """
+        Pobiera archiwum ZIP starego załącznika (BYTEA) - bez cache
+
+        Args:
+            attachment_id: ID załącznika
+
+        Returns:
+            Dane archiwum lub None
+        """
+        response = self.client.table('attachments').select(
+            'archive_data'
+        ).eq('id', attachment_id).execute()
+
+        if not response.data:
+            return None
+        return response.data[0].get('archive_data')
+
     def get_files_list(self, attachment_id: str) -> List[FileMetadata]:
         """
         Pobiera listę plików w załączniku (bez pobierania danych ZIP)
@@ -244,23 +630,14 @@ class AttachmentsManager:
             Lista FileMetadata
         """
         try:
-            response = self.client.table('attachments').select(
-                'files_metadata'
-            ).eq('id', attachment_id).execute()
-
-            if not response.data:
+            metadata = self._fetch_metadata(attachment_id)
+            if metadata is None:
                 return []
 
-            files_metadata_raw = response.data[0].get('files_metadata', '[]')
-            if isinstance(files_metadata_raw, str):
-                files_metadata_list = json.loads(files_metadata_raw)
-            else:
-                files_metadata_list = files_metadata_raw
-
-            return [FileMetadata.from_dict(m) for m in files_metadata_list]
+            return [FileMetadata.from_dict(m) for m in metadata[1]]
 
         except Exception as e:
-            print(f"❌ Błąd pobierania listy plików: {e}")
+            logger.error("❌ Błąd pobierania listy plików: %s", e)
             return []
 
     def extract_file(
@@ -279,66 +656,185 @@ class AttachmentsManager:
             Dane pliku jako bytes lub None
         """
         try:
-            # Pobierz metadane z bazy
-            response = self.client.table('attachments').select(
-                'files_metadata, storage_type, archive_data'
-            ).eq('id', attachment_id).execute()
-
-            if not response.data:
-                print(f"❌ Załącznik {attachment_id} nie został znaleziony")
+            # Pobierz metadane (z cache lub z bazy)
+            metadata = self._fetch_metadata(attachment_id)
+            if metadata is None:
+                logger.error("❌ Załącznik %s nie został znaleziony", attachment_id)
                 return None
 
-            data = response.data[0]
-            storage_type = data.get('storage_type', 'bytea')  # Domyślnie bytea dla starych załączników
+            storage_type, _, storage_paths = metadata
 
             # Sprawdź typ storage
             if storage_type == 'supabase_storage':
                 # NOWY SPOSÓB: Pobierz z Supabase Storage
-                files_metadata_raw = data.get('files_metadata', '[]')
-                if isinstance(files_metadata_raw, str):
-                    files_metadata_list = json.loads(files_metadata_raw)
-                else:
-                    files_metadata_list = files_metadata_raw
-
                 # Znajdź plik
-                storage_path = None
-                for file_meta in files_metadata_list:
-                    if file_meta.get('filename') == filename:
-                        storage_path = file_meta.get('storage_path')
-                        break
+                storage_path = storage_paths.get(filename)
 
                 if not storage_path:
-                    print(f"❌ Nie znaleziono ścieżki storage dla pliku {filename}")
+                    logger.error("❌ Nie znaleziono ścieżki storage dla pliku %s", filename)
                     return None
 
                 # Pobierz z storage
                 file_data = self.storage.download_file(storage_path)
                 if file_data:
-                    print(f"✅ Pobrano plik: {filename} ({len(file_data)} bajtów)")
+                    logger.info("✅ Pobrano plik: %s (%s bajtów)", filename, len(file_data))
                 return file_data
 
             else:
                 # KOMPATYBILNOŚĆ WSTECZNA: Stary sposób z BYTEA
-                archive_data = data.get('archive_data')
+                archive_data = self._fetch_archive_data(attachment_id)
                 if not archive_data:
-                    print(f"❌ Brak danych archiwum")
+                    logger.error("❌ Brak danych archiwum")
                     return None
 
-                # Rozpakuj plik z archiwum ZIP
+                # Rozpakuj plik z archiwum ZIP (importy tylko dla starych załączników)
+                import io
+                import zipfile
+
                 zip_buffer = io.BytesIO(archive_data)
                 with zipfile.ZipFile(zip_buffer, 'r') as zip_file:
-                    if filename not in zip_file.namelist():
-                        print(f"❌ Plik {filename} nie znaleziony w archiwum")
+                    # getinfo to odczyt z gotowego słownika - bez budowania namelist()
+                    try:
+                        info = zip_file.getinfo(filename)
+                    except KeyError:
+                        logger.error("❌ Plik %s nie znaleziony w archiwum", filename)
                         return None
 
-                    file_data = zip_file.read(filename)
-                    print(f"✅ Wyodrębniono plik: {filename} ({len(file_data)} bajtów)")
+                    file_data = zip_file.read(info)
+                    logger.info("✅ Wyodrębniono plik: %s (%s bajtów)", filename, len(file_data))
                     return file_data
 
         except Exception as e:
-            print(f"❌ Błąd wyodrębniania pliku: {e}")
+            logger.error("❌ Błąd wyodrębniania pliku: %s", e)
             return None
 
+    def extract_file_to(
+        self,
+        attachment_id: str,
+        filename: str,
+        dest_path: str
+    ) -> bool:
+        """
+        Zapisuje plik z załącznika bezpośrednio na dysk
+
+        Args:
+            attachment_id: ID załącznika
+            filename: Nazwa pliku do wyodrębnienia
+            dest_path: Ścieżka docelowa
+
+        Returns:
+            True jeśli zapisano plik, False w przypadku błędu
+        """
+        # Zapis do pliku obok docelowego - dest_path podmieniany dopiero po
+        # udanym zapisie, więc nieudany zapis nie niszczy istniejącego pliku
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(os.path.abspath(dest_path)),
+                prefix='.attachment_',
+                suffix='.part'
+            )
+            with os.fdopen(fd, 'wb') as dst:
+                written = self._write_file_to(attachment_id, filename, dst)
+            if written:
+                os.replace(tmp_path, dest_path)
+                tmp_path = None
+                logger.info("✅ Zapisano plik: %s → %s", filename, dest_path)
+            return written
+
+        except Exception as e:
+            logger.error("❌ Błąd zapisu pliku: %s", e)
+            return False
+
+        finally:
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def extract_file_to_fd(
+        self,
+        attachment_id: str,
+        filename: str,
+        fd: int
+    ) -> bool:
+        """
+        Zapisuje plik z załącznika do otwartego deskryptora (np. z tempfile.mkstemp)
+
+        Deskryptor jest zamykany po zapisie.
+
+        Args:
+            attachment_id: ID załącznika
+            filename: Nazwa pliku do wyodrębnienia
+            fd: Deskryptor pliku otwarty do zapisu
+
+        Returns:
+            True jeśli zapisano plik, False w przypadku błędu
+        """
+        try:
+            with os.fdopen(fd, 'wb', buffering=1 << 20) as dst:
+                return self._write_file_to(attachment_id, filename, dst)
+
+        except Exception as e:
+            logger.error("❌ Błąd zapisu pliku: %s", e)
+            return False
+
+    def _write_file_to(
+        self,
+        attachment_id: str,
+        filename: str,
+        dst: BinaryIO
+    ) -> bool:
+        """
+        Zapisuje plik z załącznika do otwartego pliku docelowego
+
+        Pliki ze storage i z archiwów ZIP (BYTEA) są strumieniowane blokami
+        zamiast wczytywania całości do pamięci.
+
+        Args:
+            attachment_id: ID załącznika
+            filename: Nazwa pliku do wyodrębnienia
+            dst: Plik docelowy otwarty w trybie binarnym
+
+        Returns:
+            True jeśli zapisano plik, False jeśli pliku nie znaleziono
+        """
+        metadata = self._fetch_metadata(attachment_id)
+        if metadata is None:
+            logger.error("❌ Załącznik %s nie został znaleziony", attachment_id)
+            return False
+
+        storage_type, _, storage_paths = metadata
+
+        if storage_type == 'supabase_storage':
+            storage_path = storage_paths.get(filename)
+            if not storage_path:
+                logger.error("❌ Nie znaleziono ścieżki storage dla pliku %s", filename)
+                return False
+
+            return self.storage.download_file_stream(storage_path, dst)
+
+        archive_data = self._fetch_archive_data(attachment_id)
+        if not archive_data:
+            logger.error("❌ Brak danych archiwum")
+            return False
+
+        # Importy tylko dla starych załączników BYTEA
+        import io
+        import zipfile
+
+        with zipfile.ZipFile(io.BytesIO(archive_data), 'r') as zip_file:
+            try:
+                info = zip_file.getinfo(filename)
+            except KeyError:
+                logger.error("❌ Plik %s nie znaleziony w archiwum", filename)
+                return False
+
+            with zip_file.open(info) as src:
+                shutil.copyfileobj(src, dst, length=1 << 20)
+        return True
+
     def extract_all_to_temp(
         self,
         attachment_id: str
@@ -359,27 +855,135 @@ class AttachmentsManager:
             ).eq('id', attachment_id).execute()
 
             if not response.data:
-                print(f"❌ Załącznik {attachment_id} nie został znaleziony")
+                logger.error("❌ Załącznik %s nie został znaleziony", attachment_id)
                 return None
 
             archive_data = response.data[0].get('archive_data')
             if not archive_data:
-                print(f"❌ Brak danych archiwum")
+                logger.error("❌ Brak danych archiwum")
                 return None
 
             # Utwórz folder tymczasowy
             temp_dir = tempfile.mkdtemp(prefix='attachments_')
 
-            # Rozpakuj wszystkie pliki
+            # Rozpakuj wszystkie pliki (importy tylko dla starych załączników)
+            import io
+            import zipfile
+
             zip_buffer = io.BytesIO(archive_data)
             with zipfile.ZipFile(zip_buffer, 'r') as zip_file:
                 zip_file.extractall(temp_dir)
 
-            print(f"✅ Rozpakowano załącznik do: {temp_dir}")
+            logger.info("✅ Rozpakowano załącznik do: %s", temp_dir)
+            return temp_dir
+
+        except Exception as e:
+            logger.error("❌ Błąd rozpakowywania załącznika: %s", e)
+            return None
+
+    def extract_all_to_temp_parallel(
+        self,
+        attachment_id: str
+    ) -> Optional[str]:
+        """
+        Rozpakowuje/pobiera wszystkie pliki do folderu tymczasowego równolegle
+
+        Archiwa ZIP (BYTEA) są dzielone na EXTRACT_WORKERS grup - każda grupa
+        ma własny ZipFile (ZipFile nie jest bezpieczny wątkowo), a zlib zwalnia
+        GIL podczas dekompresji. Pliki w Supabase Storage są pobierane
+        równolegle.
+
+        Args:
+            attachment_id: ID załącznika
+
+        Returns:
+            Ścieżka do folderu tymczasowego lub None
+        """
+        temp_dir = None
+        try:
+            metadata = self._fetch_metadata(attachment_id)
+            if metadata is None:
+                logger.error("❌ Załącznik %s nie został znaleziony", attachment_id)
+                return None
+
+            storage_type, files_metadata_list, _ = metadata
+
+            if self._extract_executor is None:
+                self._extract_executor = ThreadPoolExecutor(max_workers=self.EXTRACT_WORKERS)
+
+            temp_dir = tempfile.mkdtemp(prefix='attachments_')
+
+            if storage_type == 'supabase_storage':
+                # Ścieżki docelowe ustalane przed startem wątków - pliki o tej
+                # samej nazwie dostają sufiks zamiast nadpisywać się nawzajem
+                dest_paths = []
+                used_names = set()
+                for file_meta in files_metadata_list:
+                    name = os.path.basename(file_meta['filename'])
+                    stem, ext = os.path.splitext(name)
+                    counter = 1
+                    while name.lower() in used_names:
+                        name = f"{stem} ({counter}){ext}"
+                        counter += 1
+                    used_names.add(name.lower())
+                    dest_paths.append(os.path.join(temp_dir, name))
+
+                def download_one(job: Tuple[Dict, str]) -> bool:
+                    file_meta, dest_path = job
+                    with open(dest_path, 'wb') as dst:
+                        ok = self.storage.download_file_stream(file_meta.get('storage_path'), dst)
+                    if not ok:
+                        os.remove(dest_path)
+                    return ok
+
+                results = list(self._extract_executor.map(
+                    download_one, zip(files_metadata_list, dest_paths)
+                ))
+                if not all(results):
+                    logger.warning("⚠️ Nie udało się pobrać %s plików", results.count(False))
+
+            else:
+                archive_data = self._fetch_archive_data(attachment_id)
+                if not archive_data:
+                    logger.error("❌ Brak danych archiwum")
+                    shutil.rmtree(temp_dir, ignore_errors=True)
+                    return None
+
+                # Importy tylko dla starych załączników BYTEA
+                import io
+                import zipfile
+
+                with zipfile.ZipFile(io.BytesIO(archive_data), 'r') as zip_file:
+                    names = zip_file.namelist()
+
+                # Katalogi tworzone z góry - ZipFile.extract w Pythonie 3.11
+                # wywołuje os.makedirs bez exist_ok i równoległe wątki
+                # rozpakowujące pliki z jednego podfolderu kolidowałyby
+                # (pomijane '.' i '..', tak jak robi to sam ZipFile)
+                for name in names:
+                    parts = [
+                        part for part in os.path.dirname(name).split('/')
+                        if part not in ('', '.', '..')
+                    ]
+                    if parts:
+                        os.makedirs(os.path.join(temp_dir, *parts), exist_ok=True)
+
+                def extract_group(group: List[str]):
+                    # Osobny ZipFile na wątek; BytesIO współdzieli bufor archive_data
+                    with zipfile.ZipFile(io.BytesIO(archive_data), 'r') as zip_file:
+                        for name in group:
+                            zip_file.extract(name, temp_dir)
+
+                groups = [names[i::self.EXTRACT_WORKERS] for i in range(self.EXTRACT_WORKERS)]
+                list(self._extract_executor.map(extract_group, [g for g in groups if g]))
+
+            logger.info("✅ Rozpakowano załącznik do: %s", temp_dir)
             return temp_dir
 
         except Exception as e:
-            print(f"❌ Błąd rozpakowywania załącznika: {e}")
+            logger.error("❌ Błąd rozpakowywania załącznika: %s", e)
+            if temp_dir is not None:
+                shutil.rmtree(temp_dir, ignore_errors=True)
             return None
 
     def delete_attachment(self, attachment_id: str) -> bool:
@@ -394,35 +998,29 @@ class AttachmentsManager:
         """
         try:
             # Pobierz metadane przed usunięciem
-            response = self.client.table('attachments').select(
-                'files_metadata, storage_type'
-            ).eq('id', attachment_id).execute()
+            metadata = self._fetch_metadata(attachment_id)
 
-            if response.data:
-                data = response.data[0]
-                storage_type = data.get('storage_type', 'bytea')
+            if metadata is not None:
+                storage_type, files_metadata_list, _ = metadata
 
                 # Jeśli storage_type == 'supabase_storage', usuń pliki ze storage
                 if storage_type == 'supabase_storage':
-                    files_metadata_raw = data.get('files_metadata', '[]')
-                    if isinstance(files_metadata_raw, str):
-                        files_metadata_list = json.loads(files_metadata_raw)
-                    else:
-                        files_metadata_list = files_metadata_raw
-
-                    for file_meta in files_metadata_list:
-                        storage_path = file_meta.get('storage_path')
-                        if storage_path:
-                            self.storage.delete_file(storage_path)
-                            print(f"✅ Usunięto plik ze storage: {storage_path}")
+                    storage_paths = [
+                        file_meta['storage_path'] for file_meta in files_metadata_list
+                        if file_meta.get('storage_path')
+                    ]
+                    self._delete_storage_paths(
+                        self._unshared_storage_paths(storage_paths, attachment_id)
+                    )
 
             # Usuń rekord z bazy
             self.client.table('attachments').delete().eq('id', attachment_id).execute()
-            print(f"✅ Usunięto załącznik {attachment_id}")
+            self._forget_metadata(attachment_id)
+            logger.info("✅ Usunięto załącznik %s", attachment_id)
             return True
 
         except Exception as e:
-            print(f"❌ Błąd usuwania załącznika: {e}")
+            logger.error("❌ Błąd usuwania załącznika: %s", e)
             return False
 
     def copy_attachments(
@@ -437,6 +1035,10 @@ class AttachmentsManager:
         Kopiuje wszystkie załączniki z jednej encji do drugiej
         (używane przy konwersji ofert na zamówienia)
 
+        Kopiowanie wykonuje funkcja RPC copy_attachments (INSERT ... SELECT
+        w bazie, patrz migration_attachments_functions.sql). Tylko gdy funkcja
+        nie jest zainstalowana, załączniki kopiowane są przez klienta.
+
         Args:
             source_entity_type: Typ encji źródłowej ('order' lub 'quotation')
             source_entity_id: ID encji źródłowej
@@ -448,39 +1050,105 @@ class AttachmentsManager:
             Liczba skopiowanych załączników
         """
         try:
-            # Pobierz wszystkie załączniki źródłowe
-            response = self.client.table('attachments').select('*').eq(
+            response = self.client.rpc('copy_attachments', {
+                'src_type': source_entity_type,
+                'src_id': source_entity_id,
+                'dst_type': target_entity_type,
+                'dst_id': target_entity_id,
+                'p_created_by': created_by
+            }).execute()
+
+            copied_count = response.data or 0
+            logger.info("✅ Skopiowano %s załączników", copied_count)
+            return copied_count
+
+        except Exception as e:
+            # Inny błąd (np. timeout) mógł wystąpić już po wykonaniu INSERT
+            # w bazie - kopiowanie przez klienta zduplikowałoby załączniki
+            if not _is_missing_function_error(e):
+                logger.error("❌ Błąd kopiowania załączników: %s", e)
+                return 0
+            logger.warning("⚠️ RPC copy_attachments niedostępne (%s) - kopiowanie po stronie klienta", e)
+
+        return self._copy_attachments_client_side(
+            source_entity_type,
+            source_entity_id,
+            target_entity_type,
+            target_entity_id,
+            created_by
+        )
+
+    def _copy_attachments_client_side(
+        self,
+        source_entity_type: str,
+        source_entity_id: str,
+        target_entity_type: str,
+        target_entity_id: str,
+        created_by: Optional[str] = None
+    ) -> int:
+        """
+        Kopiuje załączniki przez klienta (gdy brak funkcji RPC copy_attachments)
+
+        Args:
+            source_entity_type: Typ encji źródłowej ('order' lub 'quotation')
+            source_entity_id: ID encji źródłowej
+            target_entity_type: Typ encji docelowej
+            target_entity_id: ID encji docelowej
+            created_by: Użytkownik tworzący kopię
+
+        Returns:
+            Liczba skopiowanych załączników
+        """
+        try:
+            # Pobierz załączniki źródłowe (bez archive_data)
+            response = self.client.table('attachments').select(
+                'id, files_metadata, total_size, compressed_size, files_count, storage_type'
+            ).eq(
                 'entity_type', source_entity_type
             ).eq('entity_id', source_entity_id).execute()
 
             if not response.data:
-                print(f"ℹ️ Brak załączników do skopiowania")
+                logger.info("ℹ️ Brak załączników do skopiowania")
                 return 0
 
-            copied_count = 0
-            for attachment in response.data:
-                # Utwórz kopię załącznika
-                new_attachment = {
+            # archive_data tylko dla starych załączników BYTEA (w Storage jest NULL)
+            legacy_ids = [
+                a['id'] for a in response.data
+                if a.get('storage_type') != 'supabase_storage'
+            ]
+            archive_by_id = {}
+            if legacy_ids:
+                archive_response = self.client.table('attachments').select(
+                    'id, archive_data'
+                ).in_('id', legacy_ids).execute()
+                archive_by_id = {row['id']: row['archive_data'] for row in archive_response.data}
+
+            # Kopie wszystkich załączników - wstawiane jednym żądaniem
+            notes = f"Skopiowane z {source_entity_type} {source_entity_id}"
+            new_attachments = [
+                {
                     'entity_type': target_entity_type,
                     'entity_id': target_entity_id,
-                    'archive_data': attachment['archive_data'],
+                    'archive_data': archive_by_id.get(attachment['id']),
                     'files_metadata': attachment['files_metadata'],
                     'total_size': attachment['total_size'],
                     'compressed_size': attachment.get('compressed_size'),
                     'files_count': attachment['files_count'],
                     'created_by': created_by,
-                    'notes': f"Skopiowane z {source_entity_type} {source_entity_id}"
+                    'notes': notes,
+                    'storage_type': attachment.get('storage_type')
                 }
+                for attachment in response.data
+            ]
 
-                result = self.client.table('attachments').insert(new_attachment).execute()
-                if result.data:
-                    copied_count += 1
+            result = self.client.table('attachments').insert(new_attachments).execute()
+            copied_count = len(result.data or [])
 
-            print(f"✅ Skopiowano {copied_count} załączników")
+            logger.info("✅ Skopiowano %s załączników", copied_count)
             return copied_count
 
         except Exception as e:
-            print(f"❌ Błąd kopiowania załączników: {e}")
+            logger.error("❌ Błąd kopiowania załączników: %s", e)
             return 0
 
     def get_attachment_size_summary(
@@ -491,6 +1159,44 @@ class AttachmentsManager:
         """
         Pobiera podsumowanie rozmiaru załączników
 
+        Sumy liczy funkcja RPC attachment_size_summary (jeden wiersz z bazy,
+        patrz migration_attachments_functions.sql). Jeśli funkcja nie jest
+        zainstalowana, sumowanie odbywa się po stronie klienta.
+
+        Args:
+            entity_type: Typ encji ('order' lub 'quotation')
+            entity_id: ID zamówienia lub oferty
+
+        Returns:
+            Dict z kluczami: total_size, compressed_size, files_count, attachments_count
+        """
+        try:
+            response = self.client.rpc('attachment_size_summary', {
+                'p_entity_type': entity_type,
+                'p_entity_id': entity_id
+            }).execute()
+
+            row = response.data[0] if response.data else {}
+            return {
+                'total_size': row.get('total_size') or 0,
+                'compressed_size': row.get('compressed_size') or 0,
+                'files_count': row.get('files_count') or 0,
+                'attachments_count': row.get('attachments_count') or 0
+            }
+
+        except Exception as e:
+            logger.warning("⚠️ RPC attachment_size_summary niedostępne (%s) - sumowanie po stronie klienta", e)
+
+        return self._attachment_size_summary_client_side(entity_type, entity_id)
+
+    def _attachment_size_summary_client_side(
+        self,
+        entity_type: str,
+        entity_id: str
+    ) -> Dict[str, int]:
+        """
+        Sumuje rozmiary załączników po stronie klienta (gdy brak RPC)
+
         Args:
             entity_type: Typ encji ('order' lub 'quotation')
             entity_id: ID zamówienia lub oferty
@@ -524,7 +1230,7 @@ class AttachmentsManager:
             }
 
         except Exception as e:
-            print(f"❌ Błąd pobierania podsumowania: {e}")
+            logger.error("❌ Błąd pobierania podsumowania: %s", e)
             return {
                 'total_size': 0,
                 'compressed_size': 0,
@@ -568,28 +1274,17 @@ class AttachmentsManager:
             Signed URL lub None
         """
         try:
-            response = self.client.table('attachments').select(
-                'files_metadata, storage_type'
-            ).eq('id', attachment_id).execute()
-
-            if not response.data:
+            metadata = self._fetch_metadata(attachment_id)
+            if metadata is None:
                 return None
 
-            data = response.data[0]
-            if data.get('storage_type') != 'supabase_storage':
+            storage_type, _, storage_paths = metadata
+            if storage_type != 'supabase_storage':
                 return None  # Nie dotyczy BYTEA
 
-            files_metadata_raw = data.get('files_metadata', '[]')
-            if isinstance(files_metadata_raw, str):
-                files_metadata_list = json.loads(files_metadata_raw)
-            else:
-                files_metadata_list = files_metadata_raw
-
-            for file_meta in files_metadata_list:
-                if file_meta.get('filename') == filename:
-                    storage_path = file_meta.get('storage_path')
-                    if storage_path:
-                        return self.storage.get_signed_url(storage_path)
+            storage_path = storage_paths.get(filename)
+            if storage_path:
+                return self.storage.get_signed_url(storage_path)
 
             return None
         except Exception:
@@ -606,11 +1301,11 @@ class AttachmentsManager:
         Returns:
             Sformatowany string (np. "1.5 MB")
         """
-        for unit in ['B', 'KB', 'MB', 'GB']:
-            if size_bytes < 1024.0:
-                return f"{size_bytes:.1f} {unit}"
-            size_bytes /= 1024.0
-        return f"{size_bytes:.1f} TB"
+        if size_bytes <= 0:
+            return f"{size_bytes:.1f} B"
+        # Jednostka z liczby bitów: każde 10 bitów to kolejny mnożnik 1024
+        unit_index = min(max(0, (int(size_bytes).bit_length() - 1) // 10), 4)
+        return f"{size_bytes / (1 << (10 * unit_index)):.1f} {_SIZE_UNITS[unit_index]}"
 
 
 # Funkcje pomocnicze dla łatwego użycia
@@ -620,28 +1315,30 @@ def format_file_size(size_bytes: int) -> str:
     return AttachmentsManager._format_size(size_bytes)
 
 
+# Ikony per typ MIME - słownik budowany raz przy imporcie
+_ICON_MAP = {
+    'application/pdf': '📄',
+    'application/msword': '📝',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': '📝',
+    'application/vnd.ms-excel': '📊',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': '📊',
+    'image/png': '🖼️',
+    'image/jpeg': '🖼️',
+    'image/jpg': '🖼️',
+    'image/gif': '🖼️',
+    'application/zip': '🗜️',
+    'application/x-rar': '🗜️',
+    'text/plain': '📃',
+    'application/dxf': '📐',
+    'application/dwg': '📐',
+    'application/step': '⚙️',
+    'application/stp': '⚙️',
+}
+
+
 def get_file_icon_by_type(mime_type: str) -> str:
     """Zwraca emoji/ikonę dla typu pliku"""
-    icon_map = {
-        'application/pdf': '📄',
-        'application/msword': '📝',
-        'application/vnd.openxmlformats-officedocument.wordprocessingml.document': '📝',
-        'application/vnd.ms-excel': '📊',
-        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': '📊',
-        'image/png': '🖼️',
-        'image/jpeg': '🖼️',
-        'image/jpg': '🖼️',
-        'image/gif': '🖼️',
-        'application/zip': '🗜️',
-        'application/x-rar': '🗜️',
-        'text/plain': '📃',
-        'application/dxf': '📐',
-        'application/dwg': '📐',
-        'application/step': '⚙️',
-        'application/stp': '⚙️',
-    }
-
-    return icon_map.get(mime_type, '📎')
+    return _ICON_MAP.get(mime_type, '📎')
 
 
 # Przykład użycia
@@ -7,16 +7,145 @@ Integracja z Supabase Storage dla przechowywania plików w Object Storage
 
 import os
 import io
+import atexit
+import shutil
+import re
 import mimetypes
 import tempfile
 import subprocess
+import time
 import platform
-from typing import Optional, Dict, List, Tuple
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Dict, List, Tuple, Union, BinaryIO
 from pathlib import Path
-from datetime import datetime
 import hashlib
 import json
 
+# Typy MIME najczęstszych rozszerzeń - bez pytania
+# mimetypes, który np. dla .dxf/.dwg zwraca image/vnd.* (fałszywy "obraz")
+_EXT_MIME: Dict[str, str] = {
+    '.pdf': 'application/pdf',
+    '.doc': 'application/msword',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.xls': 'application/vnd.ms-excel',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.zip': 'application/zip',
+    '.rar': 'application/x-rar',
+    '.txt': 'text/plain',
+    '.dxf': 'application/dxf',
+    '.dwg': 'application/dwg',
+    '.step': 'application/step',
+    '.stp': 'application/stp',
+}
+
+# Cache typów MIME per rozszerzenie - baza mimetypes ładowana raz przy imporcie
+# (przed startem wątków uploadu), używana tylko dla rozszerzeń spoza _EXT_MIME
+mimetypes.init()
+_MIME_CACHE: Dict[str, str] = dict(_EXT_MIME)
+
+# Komunikaty błędów storage: obiekt/bucket już istnieje (409) i brak uprawnień
+_ALREADY_EXISTS_RE = re.compile(r'already exists|duplicate', re.IGNORECASE)
+_PERMISSION_RE = re.compile(r'permission|unauthorized', re.IGNORECASE)
+
+# Katalog plików otwieranych w aplikacjach zewnętrznych - jeden na proces,
+# usuwany przy wyjściu; katalogi po nieczysto zakończonych sesjach starsze
+# niż _PREVIEW_DIR_MAX_AGE są usuwane przy tworzeniu nowego
+_PREVIEW_DIR_PREFIX = 'attachments_preview_'
+_PREVIEW_DIR_MAX_AGE = 24 * 3600
+_preview_dir: Optional[str] = None
+_preview_dir_lock = threading.Lock()
+
+# Opcjonalnie szybszy skrót treści do ścieżki pliku w storage
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+# httpx (zależność supabase) - strumieniowe pobieranie bez trzymania całego pliku w pamięci
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+
+def _path_hash(file_data: Union[bytes, BinaryIO]) -> str:
+    """
+    Skrót treści do rozróżniania nazw w ścieżce storage (nie kryptograficzny)
+
+    xxh3_64 jeśli dostępny, inaczej BLAKE2b - oba szybsze od MD5. Otwarty plik
+    czytany jest blokami, a jego pozycja przywracana.
+    """
+    digest = xxhash.xxh3_64() if XXHASH_AVAILABLE else hashlib.blake2b(digest_size=8)
+    if isinstance(file_data, (bytes, bytearray, memoryview)):
+        digest.update(file_data)
+    else:
+        start = file_data.tell()
+        for chunk in iter(lambda: file_data.read(1 << 20), b''):
+            digest.update(chunk)
+        file_data.seek(start)
+    return digest.hexdigest()
+
+
+def _get_preview_dir() -> str:
+    """Zwraca katalog plików podglądu tego procesu (tworzony przy pierwszym użyciu)"""
+    global _preview_dir
+    with _preview_dir_lock:
+        if _preview_dir is None or not os.path.isdir(_preview_dir):
+            _sweep_preview_dirs()
+            _preview_dir = tempfile.mkdtemp(prefix=_PREVIEW_DIR_PREFIX)
+            atexit.register(shutil.rmtree, _preview_dir, ignore_errors=True)
+        return _preview_dir
+
+
+def _sweep_preview_dirs():
+    """Usuwa stare katalogi podglądu pozostawione przez poprzednie sesje"""
+    cutoff = time.time() - _PREVIEW_DIR_MAX_AGE
+    try:
+        with os.scandir(tempfile.gettempdir()) as entries:
+            for entry in entries:
+                if not entry.name.startswith(_PREVIEW_DIR_PREFIX):
+                    continue
+                try:
+                    if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                except OSError:
+                    pass
+    except OSError:
+        pass
+
+
+def _has_fileno(file_data: BinaryIO) -> bool:
+    """Czy strumień jest plikiem z deskryptorem systemowym"""
+    try:
+        file_data.fileno()
+        return True
+    except (AttributeError, OSError):
+        return False
+
+
+def _stream_size(file_data: BinaryIO) -> int:
+    """
+    Rozmiar otwartego pliku binarnego
+
+    Plik na dysku - fstat bez przesuwania pozycji; strumień bez deskryptora
+    (np. io.BytesIO) - seek na koniec i powrót na poprzednią pozycję.
+    """
+    try:
+        return os.fstat(file_data.fileno()).st_size
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        start = file_data.tell()
+        size = file_data.seek(0, io.SEEK_END)
+        file_data.seek(start)
+        return size
+
 
 class AttachmentsStorage:
     """Manager do obsługi przechowywania plików w Supabase Storage"""
@@ -27,6 +156,24 @@ class AttachmentsStorage:
     # Maksymalny rozmiar pliku (50MB)
     MAX_FILE_SIZE = 50 * 1024 * 1024
 
+    # Cache-Control (max-age w sekundach) - obiekt pod daną ścieżką nigdy się nie zmienia
+    # (upsert=False, skrót treści w nazwie), więc może być cache'owany przez rok
+    CACHE_MAX_AGE = 31536000
+
+    # Liczba pozycji na stronę przy listowaniu folderów w storage
+    LIST_PAGE_SIZE = 1000
+
+    # Thumbnaile do tego rozmiaru skalowane filtrem BILINEAR (LANCZOS nie daje widocznej różnicy)
+    THUMBNAIL_BILINEAR_MAX = 256
+
+    # Cache signed URL: liczba wpisów i część ważności, po której URL jest odnawiany
+    SIGNED_URL_CACHE_SIZE = 4096
+    SIGNED_URL_REUSE_FRACTION = 0.8
+
+    # Buckety już sprawdzone w tym procesie - list_buckets raz, nie per instancja
+    _checked_buckets = set()
+    _check_lock = threading.Lock()
+
     # Formaty plików z podglądem
     PREVIEW_FORMATS = {
         # Pliki CAD
@@ -61,6 +208,9 @@ class AttachmentsStorage:
         'gz': False,
     }
 
+    # Rozszerzenia z podglądem (sprawdzane przy każdym wierszu listy)
+    _PREVIEWABLE_EXTS = frozenset(ext for ext, preview in PREVIEW_FORMATS.items() if preview)
+
     def __init__(self, supabase_client):
         """
         Inicjalizacja storage managera
@@ -71,15 +221,36 @@ class AttachmentsStorage:
         self.client = supabase_client
         self.storage = supabase_client.storage
 
+        # Cache LRU signed URL: (storage_path, expires_in) -> (ważny do wg time.monotonic(), URL)
+        self._signed_url_cache: 'OrderedDict[Tuple[str, int], Tuple[float, str]]' = OrderedDict()
+        self._signed_url_lock = threading.Lock()
+
         # Sprawdź/utwórz bucket jeśli nie istnieje
         self._ensure_bucket_exists()
 
     def _ensure_bucket_exists(self):
         """Upewnia się że bucket istnieje z lepszą obsługą błędów"""
+        with self._check_lock:
+            if self.BUCKET_NAME in self._checked_buckets:
+                return
+            if self._check_bucket():
+                self._checked_buckets.add(self.BUCKET_NAME)
+
+    def _check_bucket(self) -> bool:
+        """
+        Sprawdza bucket i tworzy go, jeśli nie istnieje
+
+        Returns:
+            True jeśli bucket istnieje (lub został utworzony), False gdy
+            sprawdzenie się nie powiodło i warto je powtórzyć
+        """
         try:
-            # Sprawdź czy bucket istnieje
+            # Sprawdź czy bucket istnieje (storage3 zwraca obiekty, starsze wersje słowniki)
             buckets = self.storage.list_buckets()
-            bucket_exists = any(b.get('name') == self.BUCKET_NAME for b in buckets)
+            bucket_exists = any(
+                (b.get('name') if isinstance(b, dict) else getattr(b, 'name', None)) == self.BUCKET_NAME
+                for b in buckets
+            )
 
             if not bucket_exists:
                 try:
@@ -94,14 +265,18 @@ class AttachmentsStorage:
                     )
                     print(f"✅ Utworzono bucket: {self.BUCKET_NAME}")
                 except Exception as create_error:
-                    error_msg = str(create_error).lower()
+                    error_msg = str(create_error)
                     # Różne możliwe komunikaty o istnieniu bucketu
-                    if any(msg in error_msg for msg in ['already exists', 'bucket already exists', 'duplicate']):
+                    if _ALREADY_EXISTS_RE.search(error_msg):
                         print(f"ℹ️ Bucket {self.BUCKET_NAME} już istnieje")
-                    elif 'permission' in error_msg or 'unauthorized' in error_msg:
+                    elif _PERMISSION_RE.search(error_msg):
                         print(f"⚠️ Brak uprawnień do utworzenia bucketu {self.BUCKET_NAME}")
+                        return False
                     else:
                         print(f"⚠️ Nie można utworzyć bucketu: {create_error}")
+                        return False
+
+            return True
 
         except AttributeError as e:
             print(f"⚠️ Nieprawidłowa konfiguracja klienta Supabase: {e}")
@@ -110,24 +285,33 @@ class AttachmentsStorage:
         except Exception as e:
             print(f"⚠️ Nieoczekiwany błąd przy sprawdzaniu bucketu: {e}")
             # Nie rzucaj wyjątku - pozwól aplikacji kontynuować
+        return False
 
     def upload_file(
         self,
-        file_data: bytes,
+        file_data: Union[bytes, BinaryIO],
         filename: str,
         entity_type: str,
         entity_id: str,
-        file_category: str = 'attachments'
+        file_category: str = 'attachments',
+        sign_url: bool = True,
+        content_hash: Optional[str] = None
     ) -> Optional[Dict[str, str]]:
         """
         Uploaduje plik do Supabase Storage
 
         Args:
-            file_data: Dane pliku jako bytes
+            file_data: Dane pliku jako bytes lub plik otwarty w trybie 'rb'
+                (wysyłany strumieniowo, bez wczytywania całości do pamięci);
+                strumień w pamięci (np. io.BytesIO) jest odczytywany do bytes
             filename: Nazwa pliku
             entity_type: Typ encji ('order' lub 'quotation')
             entity_id: ID encji
             file_category: Kategoria pliku (attachments, thumbnails, documents)
+            sign_url: Czy od razu wygenerować signed URL (dodatkowe żądanie HTTP);
+                False gdy wywołujący potrzebuje tylko storage_path
+            content_hash: Skrót treści policzony już przez wywołującego (hex) -
+                plik nie jest wtedy czytany drugi raz tylko dla ścieżki
 
         Returns:
             Dict z URL-ami (public_url, signed_url) lub None w przypadku błędu
@@ -143,61 +327,75 @@ class AttachmentsStorage:
 
         try:
             # Walidacja rozmiaru
-            file_size = len(file_data)
+            if isinstance(file_data, (bytes, bytearray, memoryview)):
+                file_size = len(file_data)
+            else:
+                file_size = _stream_size(file_data)
             if file_size > self.MAX_FILE_SIZE:
                 size_mb = self.MAX_FILE_SIZE / 1024 / 1024
                 print(f"⚠️ Plik {filename} przekracza maksymalny rozmiar {size_mb:.0f}MB")
                 return None
 
+            # storage3 wysyła bytes lub plik z dysku - strumień bez deskryptora
+            # (np. io.BytesIO, już w pamięci) zamieniany jest na bytes
+            if not isinstance(file_data, (bytes, bytearray, memoryview)) and not _has_fileno(file_data):
+                file_data = file_data.read()
+                file_size = len(file_data)
+
             if file_size == 0:
                 print(f"⚠️ Plik {filename} jest pusty")
                 return None
 
             # Generuj unikalną ścieżkę dla pliku
-            file_ext = os.path.splitext(filename)[1].lower()
-            file_hash = hashlib.md5(file_data).hexdigest()[:8]
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            file_hash = (content_hash or _path_hash(file_data))[:8]
+            timestamp = f"{time.time_ns():x}"
 
             # Struktura: entity_type/entity_id/category/timestamp_hash_filename
+            # (timestamp: nanosekundy od epoki, szesnastkowo)
             storage_path = f"{entity_type}/{entity_id}/{file_category}/{timestamp}_{file_hash}_{filename}"
 
             # Upload do storage
             bucket = self.storage.from_(self.BUCKET_NAME)
 
-            # Sprawdź czy plik już istnieje
+            content_type = guess_mime_type(filename)
+            file_options = {
+                'content-type': content_type,
+                'cache-control': str(self.CACHE_MAX_AGE),  # storage3 wysyła jako max-age=...
+                'upsert': False  # Nie nadpisuj istniejących plików
+            }
+            start_pos = None if isinstance(file_data, (bytes, bytearray, memoryview)) else file_data.tell()
+
+            # Upload pliku - kolizję nazwy zgłasza storage (409 Duplicate), bez wcześniejszego bucket.list
             try:
-                existing = bucket.list(path=f"{entity_type}/{entity_id}/{file_category}")
-                if existing and any(f['name'].endswith(filename) for f in existing):
-                    # Jeśli plik o tej nazwie istnieje, dodaj hash do nazwy
-                    storage_path = f"{entity_type}/{entity_id}/{file_category}/{timestamp}_{file_hash}_{filename}"
-            except Exception as list_error:
-                print(f"⚠️ Nie można sprawdzić istniejących plików: {list_error}")
-
-            # Upload pliku
-            response = bucket.upload(
-                path=storage_path,
-                file=file_data,
-                file_options={
-                    'content-type': mimetypes.guess_type(filename)[0] or 'application/octet-stream',
-                    'cache-control': '3600',  # Cache na 1 godzinę
-                    'upsert': False  # Nie nadpisuj istniejących plików
-                }
-            )
+                bucket.upload(path=storage_path, file=file_data, file_options=file_options)
+            except Exception as upload_error:
+                if not _ALREADY_EXISTS_RE.search(str(upload_error)):
+                    raise
+
+                # Ta sama treść i nazwa w tym samym takcie zegara - dodaj losowy sufiks
+                storage_path = (
+                    f"{entity_type}/{entity_id}/{file_category}/"
+                    f"{timestamp}_{file_hash}_{os.urandom(3).hex()}_{filename}"
+                )
+                if start_pos is not None:
+                    file_data.seek(start_pos)
+                bucket.upload(path=storage_path, file=file_data, file_options=file_options)
 
             # Pobierz URL-e
             public_url = bucket.get_public_url(storage_path)
 
             # Generuj signed URL (ważny przez 1 godzinę) dla prywatnych plików
             signed_url = None
-            try:
-                signed_response = bucket.create_signed_url(
-                    path=storage_path,
-                    expires_in=3600  # 1 godzina
-                )
-                if signed_response and 'signedURL' in signed_response:
-                    signed_url = signed_response['signedURL']
-            except Exception as url_error:
-                print(f"⚠️ Nie udało się wygenerować signed URL: {url_error}")
+            if sign_url:
+                try:
+                    signed_response = bucket.create_signed_url(
+                        path=storage_path,
+                        expires_in=3600  # 1 godzina
+                    )
+                    if signed_response and 'signedURL' in signed_response:
+                        signed_url = signed_response['signedURL']
+                except Exception as url_error:
+                    print(f"⚠️ Nie udało się wygenerować signed URL: {url_error}")
 
             print(f"✅ Uploaded: {filename} → {storage_path}")
 
@@ -207,7 +405,7 @@ class AttachmentsStorage:
                 'signed_url': signed_url,
                 'filename': filename,
                 'size': file_size,
-                'content_type': mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                'content_type': content_type
             }
 
         except ValueError as e:
@@ -259,6 +457,53 @@ class AttachmentsStorage:
             print(f"❌ Nieoczekiwany błąd pobierania pliku {storage_path}: {e}")
             return None
 
+    def download_file_stream(
+        self,
+        storage_path: str,
+        sink: BinaryIO,
+        chunk_size: int = 262144
+    ) -> bool:
+        """
+        Pobiera plik z Supabase Storage blokami prosto do otwartego pliku
+
+        W pamięci jest naraz tylko jeden blok. Bez httpx lub gdy signed URL
+        nie jest dostępny, używa download_file.
+
+        Args:
+            storage_path: Ścieżka do pliku w storage
+            sink: Plik docelowy otwarty w trybie binarnym
+            chunk_size: Rozmiar bloku w bajtach
+
+        Returns:
+            True jeśli zapisano plik
+        """
+        if not storage_path or not isinstance(storage_path, str):
+            print(f"⚠️ Nieprawidłowa ścieżka do pliku")
+            return False
+
+        signed_url = self.get_signed_url(storage_path) if HTTPX_AVAILABLE else None
+        if signed_url:
+            written = 0
+            try:
+                with httpx.stream('GET', signed_url, follow_redirects=True) as response:
+                    response.raise_for_status()
+                    for chunk in response.iter_bytes(chunk_size):
+                        sink.write(chunk)
+                        written += len(chunk)
+                return True
+            except Exception as e:
+                # Po częściowym zapisie nie da się bezpiecznie dopisać całości
+                if written:
+                    print(f"❌ Przerwane pobieranie pliku {storage_path}: {e}")
+                    return False
+                print(f"⚠️ Strumieniowe pobieranie niedostępne ({e}), pobieram w całości")
+
+        file_data = self.download_file(storage_path)
+        if not file_data:
+            return False
+        sink.write(file_data)
+        return True
+
     def delete_file(self, storage_path: str) -> bool:
         """
         Usuwa plik z Supabase Storage
@@ -277,6 +522,7 @@ class AttachmentsStorage:
         try:
             bucket = self.storage.from_(self.BUCKET_NAME)
             bucket.remove([storage_path])
+            self._forget_signed_urls([storage_path])
             print(f"✅ Usunięto plik: {storage_path}")
             return True
 
@@ -293,11 +539,44 @@ class AttachmentsStorage:
             print(f"❌ Nieoczekiwany błąd usuwania pliku {storage_path}: {e}")
             return False
 
+    def delete_files(self, storage_paths: List[str]) -> bool:
+        """
+        Usuwa wiele plików z Supabase Storage jednym żądaniem
+
+        Args:
+            storage_paths: Ścieżki plików w storage
+
+        Returns:
+            True jeśli sukces, False w przypadku błędu
+        """
+        # Walidacja wejścia
+        storage_paths = [p for p in storage_paths if p and isinstance(p, str)]
+        if not storage_paths:
+            return True
+
+        try:
+            bucket = self.storage.from_(self.BUCKET_NAME)
+            bucket.remove(storage_paths)
+            self._forget_signed_urls(storage_paths)
+            print(f"✅ Usunięto {len(storage_paths)} plików ze storage")
+            return True
+
+        except PermissionError as e:
+            print(f"❌ Brak uprawnień do usunięcia plików: {e}")
+            return False
+        except ConnectionError as e:
+            print(f"❌ Błąd połączenia podczas usuwania plików: {e}")
+            return False
+        except Exception as e:
+            print(f"❌ Nieoczekiwany błąd usuwania plików: {e}")
+            return False
+
     def list_files(
         self,
         entity_type: str,
         entity_id: str,
-        file_category: str = None
+        file_category: str = None,
+        sign_urls: bool = False
     ) -> List[Dict]:
         """
         Listuje pliki dla danej encji
@@ -306,6 +585,8 @@ class AttachmentsStorage:
             entity_type: Typ encji ('order' lub 'quotation')
             entity_id: ID encji
             file_category: Opcjonalna kategoria do filtrowania
+            sign_urls: Czy dołączyć signed_url do każdego pliku
+                (jedno zbiorcze żądanie dla całej listy)
 
         Returns:
             Lista plików z metadanymi
@@ -332,6 +613,11 @@ class AttachmentsStorage:
                     'storage_path': f"{path}/{file['name']}"
                 })
 
+            if sign_urls and result:
+                signed_urls = self.get_signed_urls([f['storage_path'] for f in result])
+                for file in result:
+                    file['signed_url'] = signed_urls.get(file['storage_path'])
+
             return result
 
         except Exception as e:
@@ -349,6 +635,10 @@ class AttachmentsStorage:
         Returns:
             Signed URL lub None
         """
+        cached = self._cached_signed_url(storage_path, expires_in)
+        if cached:
+            return cached
+
         try:
             bucket = self.storage.from_(self.BUCKET_NAME)
             response = bucket.create_signed_url(
@@ -357,6 +647,7 @@ class AttachmentsStorage:
             )
 
             if response and 'signedURL' in response:
+                self._remember_signed_url(storage_path, expires_in, response['signedURL'])
                 return response['signedURL']
 
             return None
@@ -365,6 +656,75 @@ class AttachmentsStorage:
             print(f"❌ Błąd generowania signed URL: {e}")
             return None
 
+    def get_signed_urls(self, storage_paths: List[str], expires_in: int = 3600) -> Dict[str, str]:
+        """
+        Generuje signed URL dla wielu plików jednym żądaniem
+
+        Args:
+            storage_paths: Ścieżki plików w storage
+            expires_in: Czas ważności URL w sekundach (domyślnie 1 godzina)
+
+        Returns:
+            Dict storage_path -> signed URL (bez plików, dla których się nie udało)
+        """
+        signed_urls = {}
+        missing = []
+        for storage_path in storage_paths:
+            cached = self._cached_signed_url(storage_path, expires_in)
+            if cached:
+                signed_urls[storage_path] = cached
+            else:
+                missing.append(storage_path)
+
+        if not missing:
+            return signed_urls
+
+        try:
+            bucket = self.storage.from_(self.BUCKET_NAME)
+            response = bucket.create_signed_urls(missing, expires_in)
+
+            for item in response or []:
+                # Klucz zależy od wersji storage3: signedURL lub signedUrl
+                signed_url = item.get('signedURL') or item.get('signedUrl')
+                if item.get('path') and signed_url:
+                    signed_urls[item['path']] = signed_url
+                    self._remember_signed_url(item['path'], expires_in, signed_url)
+            return signed_urls
+
+        except Exception as e:
+            print(f"❌ Błąd generowania signed URL: {e}")
+            # URL-e z cache (i te już przetworzone) pozostają ważne
+            return signed_urls
+
+    def _cached_signed_url(self, storage_path: str, expires_in: int) -> Optional[str]:
+        """Zwraca signed URL z cache, jeśli nie minęła jeszcze jego część do odnowienia"""
+        key = (storage_path, expires_in)
+        with self._signed_url_lock:
+            cached = self._signed_url_cache.get(key)
+            if cached is None:
+                return None
+            if cached[0] <= time.monotonic():
+                del self._signed_url_cache[key]
+                return None
+            self._signed_url_cache.move_to_end(key)
+            return cached[1]
+
+    def _remember_signed_url(self, storage_path: str, expires_in: int, signed_url: str):
+        """Zapisuje signed URL w cache LRU"""
+        valid_until = time.monotonic() + expires_in * self.SIGNED_URL_REUSE_FRACTION
+        with self._signed_url_lock:
+            self._signed_url_cache[(storage_path, expires_in)] = (valid_until, signed_url)
+            self._signed_url_cache.move_to_end((storage_path, expires_in))
+            if len(self._signed_url_cache) > self.SIGNED_URL_CACHE_SIZE:
+                self._signed_url_cache.popitem(last=False)
+
+    def _forget_signed_urls(self, storage_paths: List[str]):
+        """Usuwa z cache signed URL usuniętych plików"""
+        removed = set(storage_paths)
+        with self._signed_url_lock:
+            for key in [k for k in self._signed_url_cache if k[0] in removed]:
+                del self._signed_url_cache[key]
+
     def can_preview_file(self, filename: str) -> bool:
         """
         Sprawdza czy plik może być podglądany
@@ -375,77 +735,29 @@ class AttachmentsStorage:
         Returns:
             True jeśli plik może być podglądany
         """
-        ext = os.path.splitext(filename)[1].lower().lstrip('.')
-        return self.PREVIEW_FORMATS.get(ext, False)
+        return _file_ext(filename) in self._PREVIEWABLE_EXTS
 
     def has_default_application(self, filename: str) -> bool:
         """
         Sprawdza czy system ma domyślną aplikację dla typu pliku
 
+        Wynik zależy tylko od rozszerzenia i jest zapamiętywany.
+
         Args:
             filename: Nazwa pliku
 
         Returns:
             True jeśli system może otworzyć plik
         """
-        try:
-            ext = os.path.splitext(filename)[1].lower()
-
-            if platform.system() == 'Windows':
-                # Na Windows sprawdź rejestr
-                import winreg
-                try:
-                    # Sprawdź w rejestrze Windows
-                    with winreg.OpenKey(winreg.HKEY_CLASSES_ROOT, ext) as key:
-                        # Pobierz domyślną wartość (np. "txtfile")
-                        file_type = winreg.QueryValue(key, "")
-                        if file_type:
-                            # Sprawdź czy istnieje shell/open/command
-                            try:
-                                with winreg.OpenKey(
-                                    winreg.HKEY_CLASSES_ROOT,
-                                    f"{file_type}\\shell\\open\\command"
-                                ) as cmd_key:
-                                    return True
-                            except:
-                                pass
-                    return False
-                except WindowsError:
-                    return False
-
-            elif platform.system() == 'Darwin':  # macOS
-                # Użyj LaunchServices
-                mime_type, _ = mimetypes.guess_type(filename)
-                if mime_type:
-                    result = subprocess.run(
-                        ['open', '-g', '-b', 'com.apple.TextEdit', '--args'],
-                        capture_output=True,
-                        text=True
-                    )
-                    # Jeśli komenda działa, system ma aplikacje
-                    return result.returncode == 0 or True  # Zakładamy że macOS ma zawsze aplikacje
-                return False
-
-            else:  # Linux
-                # Sprawdź xdg-mime
-                mime_type, _ = mimetypes.guess_type(filename)
-                if mime_type:
-                    result = subprocess.run(
-                        ['xdg-mime', 'query', 'default', mime_type],
-                        capture_output=True,
-                        text=True
-                    )
-                    return bool(result.stdout.strip())
-                return False
-
-        except Exception as e:
-            print(f"⚠️ Błąd sprawdzania aplikacji: {e}")
-            return False
+        return _has_default_app_for_ext(os.path.splitext(filename)[1].lower())
 
     def open_file_with_default_app(self, file_data: bytes, filename: str) -> bool:
         """
         Otwiera plik w domyślnej aplikacji systemowej
 
+        Aplikacja jest uruchamiana bez czekania na jej zakończenie. Plik
+        trafia do katalogu podglądu procesu, usuwanego przy wyjściu z programu.
+
         Args:
             file_data: Dane pliku
             filename: Nazwa pliku
@@ -454,22 +766,25 @@ class AttachmentsStorage:
             True jeśli sukces
         """
         try:
+            system = platform.system()
+
             # Zapisz do pliku tymczasowego
             temp_file = tempfile.NamedTemporaryFile(
                 delete=False,
                 suffix=os.path.splitext(filename)[1],
-                prefix=os.path.splitext(filename)[0] + "_"
+                prefix=os.path.splitext(filename)[0] + "_",
+                dir=_get_preview_dir()
             )
             temp_file.write(file_data)
             temp_file.close()
 
-            # Otwórz w domyślnej aplikacji
-            if platform.system() == 'Windows':
+            # Otwórz w domyślnej aplikacji (bez blokowania GUI)
+            if system == 'Windows':
                 os.startfile(temp_file.name)
-            elif platform.system() == 'Darwin':  # macOS
-                subprocess.call(['open', temp_file.name])
+            elif system == 'Darwin':  # macOS
+                subprocess.Popen(['open', temp_file.name], start_new_session=True)
             else:  # Linux
-                subprocess.call(['xdg-open', temp_file.name])
+                subprocess.Popen(['xdg-open', temp_file.name], start_new_session=True)
 
             print(f"✅ Otwarto plik: {filename}")
             return True
@@ -480,7 +795,7 @@ class AttachmentsStorage:
 
     def generate_thumbnail(
         self,
-        file_data: bytes,
+        file_data: Union[bytes, BinaryIO],
         filename: str,
         entity_type: str,
         entity_id: str,
@@ -490,7 +805,7 @@ class AttachmentsStorage:
         Generuje thumbnail dla pliku graficznego
 
         Args:
-            file_data: Dane pliku
+            file_data: Dane pliku (bytes lub otwarty plik binarny)
             filename: Nazwa pliku
             entity_type: Typ encji
             entity_id: ID encji
@@ -509,14 +824,24 @@ class AttachmentsStorage:
                 return None
 
             # Otwórz obraz
-            image = Image.open(io.BytesIO(file_data))
+            if isinstance(file_data, (bytes, bytearray)):
+                file_data = io.BytesIO(file_data)
+            image = Image.open(file_data)
+
+            # JPEG: libjpeg skaluje już podczas dekodowania (1/2, 1/4, 1/8)
+            if ext in ('jpg', 'jpeg'):
+                image.draft('RGB', max_size)
 
             # Konwertuj do RGB jeśli potrzeba
             if image.mode not in ('RGB', 'RGBA'):
                 image = image.convert('RGB')
 
             # Zmień rozmiar zachowując proporcje
-            image.thumbnail(max_size, Image.Resampling.LANCZOS)
+            if max(max_size) <= self.THUMBNAIL_BILINEAR_MAX:
+                resample = Image.Resampling.BILINEAR
+            else:
+                resample = Image.Resampling.LANCZOS
+            image.thumbnail(max_size, resample)
 
             # Zapisz do bufora
             thumb_buffer = io.BytesIO()
@@ -530,7 +855,8 @@ class AttachmentsStorage:
                 filename=thumb_filename,
                 entity_type=entity_type,
                 entity_id=entity_id,
-                file_category='thumbnails'
+                file_category='thumbnails',
+                sign_url=False
             )
 
             return thumb_result
@@ -539,6 +865,60 @@ class AttachmentsStorage:
             print(f"⚠️ Nie udało się wygenerować thumbnail: {e}")
             return None
 
+    def _storage_paths_in_use(
+        self,
+        storage_paths: List[str],
+        entity_type: str,
+        entity_id: str
+    ) -> Optional[set]:
+        """
+        Zwraca ścieżki wskazywane przez załączniki innych encji
+
+        Załączniki samej encji są pomijane - wynik jest taki sam przed
+        i po usunięciu jej rekordów z tabeli attachments.
+
+        Args:
+            storage_paths: Ścieżki plików do sprawdzenia
+            entity_type: Typ czyszczonej encji
+            entity_id: ID czyszczonej encji
+
+        Returns:
+            Zbiór używanych ścieżek lub None, gdy nie da się tego sprawdzić
+        """
+        if not storage_paths:
+            return set()
+
+        try:
+            response = self.client.rpc('storage_paths_used_by_other_entities', {
+                'p_paths': storage_paths,
+                'p_entity_type': entity_type,
+                'p_entity_id': entity_id
+            }).execute()
+        except Exception as e:
+            print(f"⚠️ RPC storage_paths_used_by_other_entities niedostępne ({e}) - pliki pozostają w storage")
+            return None
+
+        # SETOF text: PostgREST zwraca listę wartości lub obiektów
+        return {
+            row if isinstance(row, str) else next(iter(row.values()))
+            for row in response.data or []
+        }
+
+    def _forget_blobs(self, storage_paths: List[str]):
+        """
+        Usuwa wpisy indeksu deduplikacji dla usuniętych plików
+
+        Args:
+            storage_paths: Ścieżki usuniętych plików
+        """
+        try:
+            self.client.table('attachment_blobs').delete().in_(
+                'storage_path', storage_paths
+            ).execute()
+        except Exception as e:
+            # Brak migracji attachment_blobs - nie ma czego czyścić
+            print(f"⚠️ Nie usunięto wpisów deduplikacji: {e}")
+
     def cleanup_entity_files(
         self,
         entity_type: str,
@@ -547,6 +927,10 @@ class AttachmentsStorage:
         """
         Usuwa wszystkie pliki związane z encją
 
+        Pliki wskazywane przez załączniki innych encji (deduplikacja,
+        copy_attachments) pozostają w storage. Rekordy załączników samej
+        encji mogą jeszcze istnieć - nie blokują usunięcia jej plików.
+
         Args:
             entity_type: Typ encji
             entity_id: ID encji
@@ -556,15 +940,39 @@ class AttachmentsStorage:
         """
         try:
             bucket = self.storage.from_(self.BUCKET_NAME)
-            path = f"{entity_type}/{entity_id}"
 
-            # Pobierz listę plików
-            files = bucket.list(path=path)
-
-            # Usuń wszystkie pliki
-            if files:
-                file_paths = [f"{path}/{f['name']}" for f in files]
-                bucket.remove(file_paths)
+            # Zbierz pliki ze wszystkich kategorii (attachments, thumbnails, ...)
+            # - foldery w odpowiedzi list() nie mają id
+            file_paths = []
+            pending = [f"{entity_type}/{entity_id}"]
+            while pending:
+                folder = pending.pop()
+                offset = 0
+                while True:
+                    items = bucket.list(
+                        path=folder,
+                        options={'limit': self.LIST_PAGE_SIZE, 'offset': offset}
+                    ) or []
+                    for item in items:
+                        item_path = f"{folder}/{item['name']}"
+                        if item.get('id') is None:
+                            pending.append(item_path)
+                        else:
+                            file_paths.append(item_path)
+                    if len(items) < self.LIST_PAGE_SIZE:
+                        break
+                    offset += self.LIST_PAGE_SIZE
+
+            # Po deduplikacji lub copy_attachments pliki encji mogą być
+            # wskazywane przez załączniki innych encji - te zostają
+            in_use = self._storage_paths_in_use(file_paths, entity_type, entity_id)
+            if in_use is None:
+                return 0
+            file_paths = [path for path in file_paths if path not in in_use]
+
+            # Usuń wszystkie pliki jednym żądaniem
+            if file_paths and self.delete_files(file_paths):
+                self._forget_blobs(file_paths)
                 print(f"✅ Usunięto {len(file_paths)} plików dla {entity_type}/{entity_id}")
                 return len(file_paths)
 
@@ -574,7 +982,6 @@ class AttachmentsStorage:
             print(f"❌ Błąd czyszczenia plików: {e}")
             return 0
 
-
 # Funkcje pomocnicze
 
 def format_file_size(size_bytes: int) -> str:
@@ -586,51 +993,124 @@ def format_file_size(size_bytes: int) -> str:
     return f"{size_bytes:.1f} TB"
 
 
-def get_file_icon_by_extension(filename: str) -> str:
-    """Zwraca emoji/ikonę dla typu pliku na podstawie rozszerzenia"""
-    ext = os.path.splitext(filename)[1].lower().lstrip('.')
+@lru_cache(maxsize=256)
+def _has_default_app_for_ext(ext: str) -> bool:
+    """
+    Sprawdza czy system ma domyślną aplikację dla rozszerzenia (z kropką)
 
-    icon_map = {
-        # Dokumenty
-        'pdf': '📄',
-        'doc': '📝',
-        'docx': '📝',
-        'txt': '📃',
-        'rtf': '📝',
-        # Arkusze
-        'xls': '📊',
-        'xlsx': '📊',
-        'csv': '📊',
-        # Prezentacje
-        'ppt': '📽️',
-        'pptx': '📽️',
-        # Obrazy
-        'png': '🖼️',
-        'jpg': '🖼️',
-        'jpeg': '🖼️',
-        'gif': '🖼️',
-        'bmp': '🖼️',
-        'svg': '🎨',
-        # CAD
-        'dxf': '📐',
-        'dwg': '📐',
-        'step': '⚙️',
-        'stp': '⚙️',
-        'igs': '⚙️',
-        'iges': '⚙️',
-        # Archiwa
-        'zip': '🗜️',
-        'rar': '🗜️',
-        '7z': '🗜️',
-        'tar': '🗜️',
-        'gz': '🗜️',
-        # Inne
-        'xml': '📋',
-        'json': '📋',
-        'html': '🌐',
-    }
+    Args:
+        ext: Rozszerzenie pliku, np. ".pdf"
 
-    return icon_map.get(ext, '📎')
+    Returns:
+        True jeśli system może otworzyć plik
+    """
+    try:
+        if platform.system() == 'Windows':
+            # Na Windows sprawdź rejestr
+            import winreg
+            try:
+                # Sprawdź w rejestrze Windows
+                with winreg.OpenKey(winreg.HKEY_CLASSES_ROOT, ext) as key:
+                    # Pobierz domyślną wartość (np. "txtfile")
+                    file_type = winreg.QueryValue(key, "")
+                    if file_type:
+                        # Sprawdź czy istnieje shell/open/command
+                        try:
+                            with winreg.OpenKey(
+                                winreg.HKEY_CLASSES_ROOT,
+                                f"{file_type}\\shell\\open\\command"
+                            ) as cmd_key:
+                                return True
+                        except:
+                            pass
+                return False
+            except WindowsError:
+                return False
+
+        # macOS i Linux rozpoznają typ po MIME
+        mime_type, _ = mimetypes.guess_type('file' + ext)
+        if not mime_type:
+            return False
+
+        if platform.system() == 'Darwin':  # macOS
+            # Zakładamy że macOS ma zawsze aplikacje (LaunchServices)
+            return True
+
+        # Linux - sprawdź xdg-mime
+        result = subprocess.run(
+            ['xdg-mime', 'query', 'default', mime_type],
+            capture_output=True,
+            text=True
+        )
+        return bool(result.stdout.strip())
+
+    except Exception as e:
+        print(f"⚠️ Błąd sprawdzania aplikacji: {e}")
+        return False
+
+
+def guess_mime_type(filename: str) -> str:
+    """Zwraca typ MIME pliku (z cache per rozszerzenie)"""
+    ext = os.path.splitext(filename)[1].lower()
+    mime_type = _MIME_CACHE.get(ext)
+    if mime_type is None:
+        mime_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        _MIME_CACHE[ext] = mime_type
+    return mime_type
+
+
+# Ikony typów plików wg rozszerzenia
+_EXT_ICONS = {
+    # Dokumenty
+    'pdf': '📄',
+    'doc': '📝',
+    'docx': '📝',
+    'txt': '📃',
+    'rtf': '📝',
+    # Arkusze
+    'xls': '📊',
+    'xlsx': '📊',
+    'csv': '📊',
+    # Prezentacje
+    'ppt': '📽️',
+    'pptx': '📽️',
+    # Obrazy
+    'png': '🖼️',
+    'jpg': '🖼️',
+    'jpeg': '🖼️',
+    'gif': '🖼️',
+    'bmp': '🖼️',
+    'svg': '🎨',
+    # CAD
+    'dxf': '📐',
+    'dwg': '📐',
+    'step': '⚙️',
+    'stp': '⚙️',
+    'igs': '⚙️',
+    'iges': '⚙️',
+    # Archiwa
+    'zip': '🗜️',
+    'rar': '🗜️',
+    '7z': '🗜️',
+    'tar': '🗜️',
+    'gz': '🗜️',
+    # Inne
+    'xml': '📋',
+    'json': '📋',
+    'html': '🌐',
+}
+
+
+def _file_ext(filename: str) -> str:
+    """Rozszerzenie pliku małymi literami, bez kropki (jak os.path.splitext)"""
+    name = filename.rpartition('/')[2].rpartition('\\')[2]
+    stem, dot, ext = name.lstrip('.').rpartition('.')
+    return ext.lower() if dot else ''
+
+
+def get_file_icon_by_extension(filename: str) -> str:
+    """Zwraca emoji/ikonę dla typu pliku na podstawie rozszerzenia"""
+    return _EXT_ICONS.get(_file_ext(filename), '📎')
 
 
 if __name__ == '__main__':
@@ -6,50 +6,30 @@ Handles DXF, DWG, and 3D file processing (STEP, STP, IGS, IGES)
 Generates preview images from CAD files
 """
 
+import io
 import os
+import shutil
+import hashlib
 import tempfile
 import subprocess
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Optional, Tuple, List, Dict
+from importlib.util import find_spec
 from PIL import Image, ImageDraw, ImageFont
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
-import numpy as np
-
-# Try to import ezdxf with PyMuPDF backend for better rendering
-try:
-    import ezdxf
-    from ezdxf.addons.drawing import RenderContext, Frontend, config, layout
-    # Try PyMuPDF backend first for better quality
-    try:
-        import pymupdf
-        from ezdxf.addons.drawing.pymupdf import PyMuPdfBackend
-        PYMUPDF_AVAILABLE = True
-    except ImportError:
-        PYMUPDF_AVAILABLE = False
-
-    # Always import matplotlib backend as fallback
-    from ezdxf.addons.drawing.matplotlib import MatplotlibBackend
-    EZDXF_AVAILABLE = True
-except ImportError:
-    EZDXF_AVAILABLE = False
-    PYMUPDF_AVAILABLE = False
+
+# Heavy optional libraries (ezdxf, PyMuPDF, matplotlib, OCC) are imported lazily
+# inside the functions that use them - checking for them here does not import them,
+# so is_cad_file/get_file_type and batch worker startup stay cheap.
+EZDXF_AVAILABLE = find_spec('ezdxf') is not None
+PYMUPDF_AVAILABLE = EZDXF_AVAILABLE and find_spec('pymupdf') is not None
+if not EZDXF_AVAILABLE:
     print("Warning: ezdxf not installed. DXF/DWG processing will not be available.")
 
-# Try to import OCC for 3D file processing (optional)
-try:
-    from OCC.Core.STEPControl import STEPControl_Reader
-    from OCC.Core.IGESControl import IGESControl_Reader
-    from OCC.Core.IFSelect import IFSelect_RetDone
-    from OCC.Core.BRepBndLib import brepbndlib_Add
-    from OCC.Core.Bnd import Bnd_Box
-    from OCC.Extend.DataExchange import read_step_file, read_iges_file
-    from OCC.Display import SimpleGui
-    OCC_AVAILABLE = True
-except ImportError:
-    OCC_AVAILABLE = False
+OCC_AVAILABLE = find_spec('OCC') is not None
+if not OCC_AVAILABLE:
     print("Warning: pythonocc-core not installed. 3D file processing will not be available.")
 
 # Supported file formats
@@ -59,6 +39,15 @@ IGES_FORMATS = {'.igs', '.iges'}
 CAD_3D_FORMATS = STEP_FORMATS | IGES_FORMATS
 ALL_CAD_FORMATS = DXF_FORMATS | CAD_3D_FORMATS
 
+# Longest page edge for DXF rendering (A4) - keeps pixmap size bounded
+MAX_PAGE_MM = 297
+
+# ODA File Converter (DWG -> DXF) and the folder for converted files
+ODA_CONVERTER = r"C:\Program Files\ODA\ODAFileConverter 26.4.0\ODAFileConverter.exe"
+DWG_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'cad_dwg_cache')
+# Cached DXF files not used for this long are removed (see _prune_dwg_cache)
+DWG_CACHE_MAX_AGE = 7 * 24 * 3600
+
 
 class CADProcessor:
     """Handles CAD file processing and preview generation"""
@@ -111,46 +100,215 @@ class CADProcessor:
         Returns:
             True if successful, False otherwise
         """
+        loaded = CADProcessor._load_dxf(dxf_path)
+        if loaded is None:
+            return False
+
+        doc, msp, width_mm, height_mm = loaded
+        return CADProcessor._render_dxf(doc, msp, width_mm, height_mm, output_path, dpi)
+
+    @staticmethod
+    def _dwg_cache_path(dwg_path: str, cache_dir: str) -> str:
+        """Path of the cached DXF for a DWG: SHA-1 of its first 64 KB, size and mtime"""
+        stat = os.stat(dwg_path)
+        with open(dwg_path, 'rb') as f:
+            digest = hashlib.sha1(f.read(65536))
+        digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return os.path.join(cache_dir, f"{digest.hexdigest()}.dxf")
+
+    @staticmethod
+    def _touch_cached(cached_path: str) -> bool:
+        """Mark a cached DXF as used (mtime = now); False if it is not cached"""
+        try:
+            os.utime(cached_path)
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def _prune_dwg_cache(cache_dir: str = DWG_CACHE_DIR, max_age: float = DWG_CACHE_MAX_AGE) -> int:
+        """
+        Remove cached DXF files not used for max_age seconds
+
+        Cache hits refresh the file mtime, so only stale conversions go.
+
+        Args:
+            cache_dir: Directory for converted DXF files
+            max_age: Maximum age in seconds since last use
+
+        Returns:
+            Number of removed files
+        """
+        cutoff = time.time() - max_age
+        removed = 0
+        try:
+            with os.scandir(cache_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith('.dxf') or not entry.is_file():
+                        continue
+                    try:
+                        if entry.stat().st_mtime < cutoff:
+                            os.remove(entry.path)
+                            removed += 1
+                    except OSError:
+                        pass  # In use by another process or already removed
+        except FileNotFoundError:
+            pass
+        return removed
+
+    @staticmethod
+    def _dwg_to_dxf_cached(dwg_path: str, cache_dir: str = DWG_CACHE_DIR) -> Optional[str]:
+        """
+        Convert DWG to DXF with ODA File Converter, reusing earlier conversions
+
+        The converted DXF is kept in cache_dir, so re-rendering the same DWG
+        (other resolution, retry, next batch) skips the converter subprocess.
+
+        Args:
+            dwg_path: Path to DWG file
+            cache_dir: Directory for converted DXF files
+
+        Returns:
+            Path to the converted DXF file or None on error
+        """
+        cached_path = CADProcessor._dwg_cache_path(dwg_path, cache_dir)
+        if CADProcessor._touch_cached(cached_path):
+            return cached_path
+
+        if not os.path.exists(ODA_CONVERTER):
+            print("Warning: ODA File Converter not found. Cannot process DWG files.")
+            return None
+
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with tempfile.TemporaryDirectory(dir=cache_dir) as output_dir:
+                subprocess.run([
+                    ODA_CONVERTER,
+                    str(Path(dwg_path).parent),
+                    output_dir,
+                    "ACAD2018",  # Output version
+                    "DXF",       # Output format
+                    "0",         # Recurse
+                    "1",         # Audit
+                    str(Path(dwg_path).name)
+                ], check=True, capture_output=True, timeout=30)
+
+                # ODA writes <name>.dxf into the output folder
+                converted = os.path.join(output_dir, Path(dwg_path).stem + '.dxf')
+                if not os.path.exists(converted):
+                    print(f"Warning: ODA File Converter produced no DXF for {dwg_path}")
+                    return None
+                os.replace(converted, cached_path)
+
+            return cached_path
+
+        except Exception as e:
+            print(f"Warning: Could not convert DWG to DXF: {e}")
+            return None
+
+    @staticmethod
+    def convert_dwg_folder_to_dxf(
+        dwg_paths: List[str],
+        cache_dir: str = DWG_CACHE_DIR
+    ) -> Dict[str, str]:
+        """
+        Convert many DWG files to DXF with a single ODA File Converter run
+
+        Files not yet in the cache are staged (hard link or copy) in one input
+        folder, so the converter starts once per batch instead of once per file.
+        Results land in the same cache as _dwg_to_dxf_cached.
+
+        Args:
+            dwg_paths: Paths to DWG files
+            cache_dir: Directory for converted DXF files
+
+        Returns:
+            Dict {dwg_path: dxf_path} for files converted (or already cached)
+        """
+        converted = {}
+        pending = []
+        for dwg_path in dict.fromkeys(dwg_paths):
+            try:
+                cached_path = CADProcessor._dwg_cache_path(dwg_path, cache_dir)
+            except OSError as e:
+                print(f"Warning: Cannot read DWG file {dwg_path}: {e}")
+                continue
+            if CADProcessor._touch_cached(cached_path):
+                converted[dwg_path] = cached_path
+            else:
+                pending.append((dwg_path, cached_path))
+
+        if not pending:
+            return converted
+
+        if not os.path.exists(ODA_CONVERTER):
+            print("Warning: ODA File Converter not found. Cannot process DWG files.")
+            return converted
+
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with tempfile.TemporaryDirectory(dir=cache_dir) as staging_dir:
+                input_dir = os.path.join(staging_dir, 'in')
+                output_dir = os.path.join(staging_dir, 'out')
+                os.makedirs(input_dir)
+                os.makedirs(output_dir)
+
+                # Numbered names - source files may share a name across folders
+                for i, (dwg_path, _) in enumerate(pending):
+                    staged_path = os.path.join(input_dir, f"{i}.dwg")
+                    try:
+                        os.link(dwg_path, staged_path)
+                    except OSError:
+                        shutil.copyfile(dwg_path, staged_path)
+
+                subprocess.run([
+                    ODA_CONVERTER,
+                    input_dir,
+                    output_dir,
+                    "ACAD2018",  # Output version
+                    "DXF",       # Output format
+                    "0",         # Recurse
+                    "1",         # Audit
+                    "*.DWG"
+                ], check=True, capture_output=True, timeout=30 + 10 * len(pending))
+
+                for i, (dwg_path, cached_path) in enumerate(pending):
+                    output_path = os.path.join(output_dir, f"{i}.dxf")
+                    if os.path.exists(output_path):
+                        os.replace(output_path, cached_path)
+                        converted[dwg_path] = cached_path
+                    else:
+                        print(f"Warning: ODA File Converter produced no DXF for {dwg_path}")
+
+        except Exception as e:
+            print(f"Warning: Could not convert DWG files to DXF: {e}")
+
+        return converted
+
+    @staticmethod
+    def _load_dxf(dxf_path: str):
+        """
+        Read DXF (or DWG via ODA File Converter) and compute the page size
+
+        Args:
+            dxf_path: Path to DXF/DWG file
+
+        Returns:
+            Tuple (doc, msp, width_mm, height_mm) or None on error
+        """
         if not EZDXF_AVAILABLE:
             print("Error: ezdxf not available. Cannot process DXF files.")
-            return False
+            return None
 
-        temp_dxf_path = None
         try:
             # Handle DWG files by converting to DXF first (if ODA converter is available)
-            ext = Path(dxf_path).suffix.lower()
-            if ext == '.dwg':
-                temp_dxf = tempfile.NamedTemporaryFile(suffix='.dxf', delete=False)
-                temp_dxf_path = temp_dxf.name
-                temp_dxf.close()
-
-                # Try to convert DWG to DXF using ODA File Converter
-                oda_converter = r"C:\Program Files\ODA\ODAFileConverter 26.4.0\ODAFileConverter.exe"
-                if os.path.exists(oda_converter):
-                    try:
-                        input_dir = str(Path(dxf_path).parent)
-                        output_dir = str(Path(temp_dxf_path).parent)
-                        subprocess.run([
-                            oda_converter,
-                            input_dir,
-                            output_dir,
-                            "ACAD2018",  # Output version
-                            "DXF",       # Output format
-                            "0",         # Recurse
-                            "1",         # Audit
-                            str(Path(dxf_path).name)
-                        ], check=True, capture_output=True, timeout=30)
-                        dxf_path = temp_dxf_path
-                    except Exception as e:
-                        print(f"Warning: Could not convert DWG to DXF: {e}")
-                        if temp_dxf_path and os.path.exists(temp_dxf_path):
-                            os.unlink(temp_dxf_path)
-                        return False
-                else:
-                    print("Warning: ODA File Converter not found. Cannot process DWG files.")
-                    if temp_dxf_path and os.path.exists(temp_dxf_path):
-                        os.unlink(temp_dxf_path)
-                    return False
+            if Path(dxf_path).suffix.lower() == '.dwg':
+                dxf_path = CADProcessor._dwg_to_dxf_cached(dxf_path)
+                if dxf_path is None:
+                    return None
+
+            import ezdxf
+            from ezdxf import bbox
 
             # Read DXF file
             doc = ezdxf.readfile(dxf_path)
@@ -158,7 +316,9 @@ class CADProcessor:
 
             # Get drawing extents to calculate proper page size
             try:
-                extents = msp.extents()
+                extents = bbox.extents(msp, fast=True)
+                if not extents.has_data:
+                    raise ValueError("empty drawing")
                 # Calculate size in mm from drawing units
                 width_mm = abs(extents.extmax.x - extents.extmin.x)
                 height_mm = abs(extents.extmax.y - extents.extmin.y)
@@ -166,108 +326,149 @@ class CADProcessor:
                 # Ensure minimum size and add margins
                 width_mm = max(width_mm, 100) * 1.1
                 height_mm = max(height_mm, 100) * 1.1
+
+                # Keep the aspect ratio but cap the page at A4 so large parts
+                # do not produce huge pixmaps
+                scale = min(1.0, MAX_PAGE_MM / max(width_mm, height_mm))
+                width_mm *= scale
+                height_mm *= scale
             except:
                 # If extents cannot be calculated, use A4 size
                 width_mm = 297  # A4 landscape
                 height_mm = 210
 
-            if PYMUPDF_AVAILABLE:
-                # Use PyMuPDF backend for better quality
-                try:
-                    # Step 1: Create render context
-                    ctx = RenderContext(doc)
-
-                    # Step 2: Configure rendering
-                    cfg = config.Configuration(
-                        background_policy=config.BackgroundPolicy.WHITE,
-                        color_policy=config.ColorPolicy.BLACK,
-                        lineweight_scaling=1.0,
-                        min_lineweight=0.24,
-                    )
-
-                    # Step 3: Instantiate backend
-                    backend = PyMuPdfBackend()
-
-                    # Step 4: Configure frontend and draw
-                    frontend = Frontend(ctx, backend, config=cfg)
-                    frontend.draw_layout(msp, finalize=True)
-
-                    # Step 5: Setup page layout with proper dimensions
-                    page = layout.Page(
-                        width_mm,
-                        height_mm,
-                        layout.Units.mm,
-                        margins=layout.Margins.all(2)
-                    )
-
-                    # Step 6: Get PDF bytes and convert to PNG
-                    pdf_bytes = backend.get_pdf_bytes(page)
-
-                    # Open PDF from bytes
-                    pdf_doc = pymupdf.open("pdf", pdf_bytes)
-
-                    # Get first page
-                    pdf_page = pdf_doc[0]
-
-                    # Calculate zoom for desired DPI
-                    # PyMuPDF uses 72 DPI as base
-                    zoom = dpi / 72.0
-                    mat = pymupdf.Matrix(zoom, zoom)
-
-                    # Render to pixmap
-                    pix = pdf_page.get_pixmap(matrix=mat, alpha=False)
-
-                    # Save as PNG
-                    pix.save(output_path)
-
-                    # Cleanup
-                    pdf_doc.close()
-
-                    # Clean up temporary DXF if it was created from DWG
-                    if temp_dxf_path and os.path.exists(temp_dxf_path):
-                        try:
-                            os.unlink(temp_dxf_path)
-                        except:
-                            pass
-
-                    return True
-
-                except Exception as e:
-                    print(f"PyMuPDF rendering failed: {e}, falling back to matplotlib")
-                    # Fallback to matplotlib
-                    result = CADProcessor._process_dxf_with_matplotlib(doc, msp, output_path, (1920, 1080))
-                    if temp_dxf_path and os.path.exists(temp_dxf_path):
-                        try:
-                            os.unlink(temp_dxf_path)
-                        except:
-                            pass
-                    return result
-            else:
-                # Use matplotlib backend as fallback
-                result = CADProcessor._process_dxf_with_matplotlib(doc, msp, output_path, (1920, 1080))
-                if temp_dxf_path and os.path.exists(temp_dxf_path):
-                    try:
-                        os.unlink(temp_dxf_path)
-                    except:
-                        pass
-                return result
+            return doc, msp, width_mm, height_mm
 
         except Exception as e:
             print(f"Error processing DXF file {dxf_path}: {e}")
             import traceback
             traceback.print_exc()
-            # Clean up temporary file on error
-            if temp_dxf_path and os.path.exists(temp_dxf_path):
-                try:
-                    os.unlink(temp_dxf_path)
-                except:
-                    pass
-            return False
+            return None
+
+    @staticmethod
+    def _render_dxf(
+        doc,
+        msp,
+        width_mm: float,
+        height_mm: float,
+        output_path: str,
+        dpi: int
+    ) -> bool:
+        """
+        Render a loaded DXF document to PNG
+
+        Args:
+            doc: ezdxf document
+            msp: Modelspace of the document
+            width_mm: Page width in mm
+            height_mm: Page height in mm
+            output_path: Path to save output PNG image
+            dpi: Resolution in DPI
+
+        Returns:
+            True if successful, False otherwise
+        """
+        if not PYMUPDF_AVAILABLE:
+            # Use matplotlib backend as fallback
+            return CADProcessor._process_dxf_with_matplotlib(doc, msp, output_path, (1920, 1080))
+
+        # Use PyMuPDF backend for better quality
+        try:
+            import pymupdf
+            from ezdxf.addons.drawing import RenderContext, Frontend, config, layout
+            from ezdxf.addons.drawing.pymupdf import PyMuPdfBackend
+
+            # Step 1: Create render context
+            ctx = RenderContext(doc)
+
+            # Step 2: Configure rendering
+            cfg = config.Configuration(
+                background_policy=config.BackgroundPolicy.WHITE,
+                color_policy=config.ColorPolicy.BLACK,
+                lineweight_scaling=1.0,
+                min_lineweight=0.24,
+            )
+
+            # Step 3: Instantiate backend
+            backend = PyMuPdfBackend()
+
+            # Step 4: Configure frontend and draw
+            frontend = Frontend(ctx, backend, config=cfg)
+            frontend.draw_layout(msp, finalize=True)
+
+            # Step 5: Setup page layout with proper dimensions
+            page = layout.Page(
+                width_mm,
+                height_mm,
+                layout.Units.mm,
+                margins=layout.Margins.all(2)
+            )
+
+            # Step 6: Rasterize the page
+            if hasattr(backend, 'get_pixmap_bytes'):
+                # ezdxf >= 1.1: replayed straight onto a PyMuPDF page, no PDF
+                # round-trip; PPM is uncompressed, so PNG is encoded only once
+                ppm_bytes = backend.get_pixmap_bytes(page, fmt='ppm', dpi=dpi, alpha=False)
+                with Image.open(io.BytesIO(ppm_bytes)) as img:
+                    CADProcessor._save_png(img, output_path)
+            else:
+                # Older ezdxf: via PDF bytes
+                pdf_bytes = backend.get_pdf_bytes(page)
+
+                # Open PDF from bytes
+                pdf_doc = pymupdf.open("pdf", pdf_bytes)
+
+                # Get first page
+                pdf_page = pdf_doc[0]
+
+                # Calculate zoom for desired DPI
+                # PyMuPDF uses 72 DPI as base
+                zoom = dpi / 72.0
+                mat = pymupdf.Matrix(zoom, zoom)
+
+                # Render to pixmap
+                pix = pdf_page.get_pixmap(matrix=mat, alpha=False)
+
+                # Save as PNG
+                CADProcessor._save_pixmap_png(pix, output_path)
+
+                # Cleanup
+                pdf_doc.close()
+
+            return True
+
+        except Exception as e:
+            print(f"PyMuPDF rendering failed: {e}, falling back to matplotlib")
+            # Fallback to matplotlib
+            return CADProcessor._process_dxf_with_matplotlib(doc, msp, output_path, (1920, 1080))
+
+    @staticmethod
+    def _save_pixmap_png(pix, output_path: str):
+        """
+        Save PyMuPDF pixmap as optimized PNG
+
+        CAD previews are mostly flat white background with thin lines, where
+        Pillow's optimize (strongest deflate) gives much smaller files than
+        the default pix.save().
+        """
+        mode = {1: 'L', 3: 'RGB', 4: 'RGBA'}[pix.n]
+        CADProcessor._save_png(Image.frombytes(mode, (pix.width, pix.height), pix.samples), output_path)
+
+    @staticmethod
+    def _save_png(img, output_path: str):
+        """Save Pillow image as PNG with the strongest deflate (see _save_pixmap_png)"""
+        img.save(output_path, 'PNG', optimize=True)
 
     @staticmethod
     def _process_dxf_with_matplotlib(doc, msp, output_path: str, image_size: Tuple[int, int]) -> bool:
         """Fallback method using matplotlib backend"""
         try:
+            import matplotlib
+            matplotlib.use('Agg')  # Use non-interactive backend
+            import matplotlib.pyplot as plt
+            from ezdxf.addons.drawing import RenderContext, Frontend
+            from ezdxf.addons.drawing.matplotlib import MatplotlibBackend
+
             # Create matplotlib figure
             fig = plt.figure(figsize=(image_size[0]/100, image_size[1]/100), dpi=100)
             ax = fig.add_axes([0, 0, 1, 1])
@@ -285,7 +486,7 @@ class CADProcessor:
 
             # Save figure
             plt.savefig(output_path, dpi=100, bbox_inches='tight', pad_inches=0.1,
-                       facecolor='white', edgecolor='none')
+                       facecolor='white', edgecolor='none', pil_kwargs={'optimize': True})
             plt.close(fig)
 
             return True
@@ -383,6 +584,8 @@ class CADProcessor:
             return CADProcessor._create_3d_placeholder(step_path, output_path, "STEP")
 
         try:
+            from OCC.Extend.DataExchange import read_step_file
+
             # Read STEP file
             shape = read_step_file(step_path)
             if shape is None:
@@ -486,6 +689,8 @@ class CADProcessor:
             return CADProcessor._create_3d_placeholder(iges_path, output_path, "IGES")
 
         try:
+            from OCC.Extend.DataExchange import read_iges_file
+
             # Read IGES file
             shape = read_iges_file(iges_path)
             if shape is None:
@@ -553,7 +758,7 @@ class CADProcessor:
             draw.text(((800 - text_width) // 2, y_offset), note, fill='#666666', font=font_small)
 
             # Save image
-            img.save(output_path, 'PNG')
+            img.save(output_path, 'PNG', optimize=True)
             return True
 
         except Exception as e:
@@ -569,6 +774,9 @@ class CADProcessor:
     ) -> bool:
         """Create info image with bounding box for 3D files"""
         try:
+            from OCC.Core.Bnd import Bnd_Box
+            from OCC.Core.BRepBndLib import brepbndlib_Add
+
             # Get bounding box
             bbox = Bnd_Box()
             brepbndlib_Add(shape, bbox)
@@ -636,7 +844,7 @@ class CADProcessor:
             draw.text(((800 - text_width) // 2, y_offset), text, fill='#ffffff', font=font_small)
 
             # Save
-            img.save(output_path, 'PNG')
+            img.save(output_path, 'PNG', optimize=True)
             return True
 
         except Exception as e:
@@ -692,11 +900,29 @@ class CADProcessor:
         file_type = CADProcessor.get_file_type(cad_path)
 
         if file_type == 'dxf':
-            # Generate high-res version (300 DPI)
-            high_res_success = CADProcessor.process_dxf_to_image(cad_path, high_res_output, dpi=300)
+            # Parse the file (and convert DWG) once for both renders
+            loaded = CADProcessor._load_dxf(cad_path)
+            if loaded is None:
+                return (False, False)
 
-            # Generate low-res version (72 DPI) - good for thumbnails
-            low_res_success = CADProcessor.process_dxf_to_image(cad_path, low_res_output, dpi=72)
+            doc, msp, width_mm, height_mm = loaded
+
+            # Generate high-res version (300 DPI)
+            high_res_success = CADProcessor._render_dxf(
+                doc, msp, width_mm, height_mm, high_res_output, dpi=300
+            )
+
+            # Generate low-res version (72 DPI) - good for thumbnails.
+            # Downscaling the 300 DPI image is much cheaper than a second render
+            low_res_success = False
+            if high_res_success:
+                low_res_success = CADProcessor._downscale_png(
+                    high_res_output, low_res_output, 72 / 300
+                )
+            if not low_res_success:
+                low_res_success = CADProcessor._render_dxf(
+                    doc, msp, width_mm, height_mm, low_res_output, dpi=72
+                )
 
             return (high_res_success, low_res_success)
 
@@ -719,11 +945,11 @@ class CADProcessor:
                     img = Image.open(temp_path)
 
                     # Save high-res
-                    img.save(high_res_output, 'PNG')
+                    img.save(high_res_output, 'PNG', optimize=True)
 
                     # Create low-res (200x200 thumbnail)
                     img.thumbnail((200, 200), Image.Resampling.LANCZOS)
-                    img.save(low_res_output, 'PNG')
+                    img.save(low_res_output, 'PNG', optimize=True)
 
                     # Clean up temp file
                     os.unlink(temp_path)
@@ -743,6 +969,75 @@ class CADProcessor:
             print(f"Unsupported CAD file type: {file_type}")
             return (False, False)
 
+    @staticmethod
+    def _downscale_png(source_path: str, output_path: str, factor: float) -> bool:
+        """
+        Save a downscaled copy of a PNG image
+
+        Args:
+            source_path: Path to source PNG
+            output_path: Path to save the smaller PNG
+            factor: Scale factor (e.g. 72/300)
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            with Image.open(source_path) as img:
+                size = (max(1, round(img.width * factor)), max(1, round(img.height * factor)))
+                img.thumbnail(size, Image.Resampling.LANCZOS)
+                img.save(output_path, 'PNG', optimize=True)
+            return True
+        except Exception as e:
+            print(f"Error downscaling {source_path}: {e}")
+            return False
+
+    @staticmethod
+    def process_cad_files_batch(
+        jobs: List[Tuple[str, str, str]],
+        max_workers: Optional[int] = None
+    ) -> List[Tuple[bool, bool]]:
+        """
+        Process many CAD files in parallel worker processes
+
+        Rendering is CPU-bound, so each file is converted in a separate process
+        (process_cad_file_both_resolutions). On Windows the caller must run this
+        under an ``if __name__ == '__main__':`` guard.
+
+        Args:
+            jobs: List of (cad_path, high_res_output, low_res_output)
+            max_workers: Number of worker processes (default: CPU count)
+
+        Returns:
+            List of (high_res_success, low_res_success) in the order of jobs
+        """
+        results = [(False, False)] * len(jobs)
+        if not jobs:
+            return results
+
+        # Convert all DWG files in one ODA run - workers then read them from the cache
+        dwg_paths = [job[0] for job in jobs if Path(job[0]).suffix.lower() == '.dwg']
+        if dwg_paths:
+            CADProcessor._prune_dwg_cache()
+        if len(dwg_paths) > 1:
+            CADProcessor.convert_dwg_folder_to_dxf(dwg_paths)
+
+        # Single file or single worker - no point in starting a pool
+        if len(jobs) == 1 or max_workers == 1:
+            return [_convert_one(job) for job in jobs]
+
+        workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_convert_one, job): i for i, job in enumerate(jobs)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    print(f"Error processing CAD file {jobs[i][0]}: {e}")
+
+        return results
+
     @staticmethod
     def extract_dxf_info(dxf_path: str) -> dict:
         """
@@ -758,21 +1053,24 @@ class CADProcessor:
             return {'error': 'ezdxf not available'}
 
         try:
+            import ezdxf
+            from ezdxf import bbox as ezdxf_bbox
+
             doc = ezdxf.readfile(dxf_path)
             msp = doc.modelspace()
 
-            # Count entities
-            entity_counts = {}
-            for entity in msp:
-                entity_type = entity.dxftype()
-                entity_counts[entity_type] = entity_counts.get(entity_type, 0) + 1
+            # Count entities (single pass, counted in C)
+            entity_counts = dict(Counter(entity.dxftype() for entity in msp))
 
             # Get layer names
             layers = [layer.dxf.name for layer in doc.layers]
 
-            # Get extents (bounding box)
+            # Get extents (bounding box) - fast: curves bounded by control points,
+            # accurate enough for metadata
             try:
-                extents = msp.extents()
+                extents = ezdxf_bbox.extents(msp, fast=True)
+                if not extents.has_data:
+                    raise ValueError("empty drawing")
                 bbox = {
                     'min_x': extents.extmin.x,
                     'min_y': extents.extmin.y,
@@ -797,6 +1095,11 @@ class CADProcessor:
             return {'error': str(e)}
 
 
+def _convert_one(job: Tuple[str, str, str]) -> Tuple[bool, bool]:
+    """Batch worker - module level so it can be pickled for the process pool"""
+    return CADProcessor.process_cad_file_both_resolutions(*job)
+
+
 def get_cad_file_info(file_path: str) -> dict:
     """
     Get information about a CAD file
@@ -294,59 +294,101 @@ Migration script from JSON backup to MySQL
 """
 
 import json
+import logging
 import mysql.connector
 from datetime import datetime
+from itertools import islice, chain
 import base64
 
+logger = logging.getLogger('migrate_to_mysql')
+
+# Optional streaming JSON parser (pip install ijson) - rows are read one at a time
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
 # MySQL connection config
 MYSQL_CONFIG = {
     'host': 'your_host.seohost.pl',
     'user': 'your_username',
     'password': 'your_password',
-    'database': 'manufacturing_system'
+    'database': 'manufacturing_system',
+    'use_pure': False,      # C extension when available
+    'autocommit': False
 }
 
+# Rows sent per executemany call
+BATCH_SIZE = 1000
+
+# Log progress every N batches (no output inside the insert loop otherwise)
+PROGRESS_EVERY = 10
+
+def row_values(row, columns, binary_columns):
+    """Build the value tuple for one row (base64 binary columns decoded)"""
+    values = []
+    for col in columns:
+        val = row.get(col)
+        if col in binary_columns and val and isinstance(val, str):
+            # Decode base64 to bytes
+            val = base64.b64decode(val)
+        values.append(val)
+    return tuple(values)
+
+def iter_rows(f):
+    """Yield rows of a JSON array file (streamed with ijson when installed)"""
+    if IJSON_AVAILABLE:
+        # use_float=True keeps floats as float instead of Decimal
+        return ijson.items(f, 'item', use_float=True)
+    return iter(json.load(f))
+
 def migrate_table(table_name, json_file):
     """Migrate single table from JSON to MySQL"""
-
-    # Load JSON data
-    with open(json_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    if not data:
-        print(f"No data in {table_name}")
+    with open(json_file, 'rb') as f:
+        _migrate_rows(table_name, iter_rows(f))
+
+def _migrate_rows(table_name, data):
+    """Insert rows from an iterator of dicts into a MySQL table"""
+    first = next(data, None)
+    if first is None:
+        logger.info("No data in %s", table_name)
         return
+    data = chain([first], data)
 
     # Connect to MySQL
     conn = mysql.connector.connect(**MYSQL_CONFIG)
     cursor = conn.cursor()
 
     # Prepare insert statement
-    columns = list(data[0].keys())
+    columns = list(first.keys())
+    binary_columns = {col for col in columns if col.endswith('_binary')}
     placeholders = ', '.join(['%s'] * len(columns))
     insert_sql = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
 
-    # Insert data
-    for row in data:
-        # Handle binary data (decode from base64 if needed)
-        values = []
-        for col in columns:
-            val = row.get(col)
-            if col.endswith('_binary') and val and isinstance(val, str):
-                # Decode base64 to bytes
-                val = base64.b64decode(val)
-            values.append(val)
-
-        cursor.execute(insert_sql, values)
-
-    conn.commit()
-    print(f"Migrated {len(data)} records to {table_name}")
-
-    cursor.close()
-    conn.close()
+    # Insert data in batches - one round-trip per BATCH_SIZE rows
+    rows = (row_values(row, columns, binary_columns) for row in data)
+    migrated = 0
+    try:
+        for i, batch in enumerate(iter(lambda: list(islice(rows, BATCH_SIZE)), []), 1):
+            cursor.executemany(insert_sql, batch)
+            migrated += len(batch)
+            if i % PROGRESS_EVERY == 0:
+                logger.info("%s: %d records inserted", table_name, migrated)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+    logger.info("Migrated %d records to %s", migrated, table_name)
 
 # Main migration
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
     tables = [
         'customers',
         'materials_dict',
@@ -359,11 +401,11 @@ if __name__ == "__main__":
 
     for table in tables:
         json_file = f"{table}.json"
-        print(f"Migrating {table}...")
+        logger.info("Migrating %s...", table)
         try:
             migrate_table(table, json_file)
         except Exception as e:
-            print(f"Error migrating {table}: {e}")
+            logger.error("Error migrating %s: %s", table, e)
 '''
 
         with open(migration_file, 'w') as f:
@@ -0,0 +1,27 @@
+-- ============================================
+-- Migracja: files_metadata jako natywny jsonb
+-- ============================================
+-- Starsze wersje AttachmentsManager zapisywały files_metadata jako napis
+-- z JSON-em (json.dumps). Po migracji kolumna zawsze przechowuje tablicę
+-- JSON, a PostgREST zwraca ją do Pythona jako gotową listę - bez
+-- parsowania JSON przy każdym odczycie załącznika.
+
+-- 1. Zmień typ kolumny na jsonb (dla kolumny text parsuje zawartość)
+ALTER TABLE attachments
+ALTER COLUMN files_metadata TYPE jsonb USING files_metadata::jsonb;
+
+-- 2. Rozpakuj wartości zapisane jako napis JSON ("[{...}]" -> [{...}])
+UPDATE attachments
+SET files_metadata = (files_metadata #>> '{}')::jsonb
+WHERE jsonb_typeof(files_metadata) = 'string';
+
+-- 3. Komentarz do kolumny
+COMMENT ON COLUMN attachments.files_metadata IS
+'Tablica JSON z metadanymi plików: filename, size, type, added_at, storage_path';
+
+-- ============================================
+-- Sprawdzenie po migracji (oczekiwane: tylko 'array')
+-- ============================================
+-- SELECT jsonb_typeof(files_metadata), COUNT(*)
+-- FROM attachments
+-- GROUP BY 1;
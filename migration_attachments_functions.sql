@@ -0,0 +1,151 @@
+-- =====================================================
+-- Funkcje RPC dla tabeli attachments
+-- =====================================================
+-- Opis: Operacje na załącznikach wykonywane w całości po stronie
+--       bazy (bez przesyłania danych przez klienta Python)
+-- Wywołanie z Python: client.rpc('<nazwa_funkcji>', {...}).execute()
+-- =====================================================
+
+-- -----------------------------------------------------
+-- copy_attachments - kopiuje załączniki encji (np. oferta -> zamówienie)
+-- -----------------------------------------------------
+-- INSERT ... SELECT wewnątrz Postgresa: archive_data (BYTEA) nie opuszcza
+-- bazy, a dla załączników w Supabase Storage kopiowane są tylko metadane.
+-- Zwraca liczbę skopiowanych załączników.
+CREATE OR REPLACE FUNCTION copy_attachments(
+    src_type attachments.entity_type%TYPE,
+    src_id attachments.entity_id%TYPE,
+    dst_type attachments.entity_type%TYPE,
+    dst_id attachments.entity_id%TYPE,
+    p_created_by attachments.created_by%TYPE DEFAULT NULL
+)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    copied integer;
+BEGIN
+    INSERT INTO attachments (
+        entity_type, entity_id, archive_data, files_metadata, total_size,
+        compressed_size, files_count, created_by, notes, storage_type
+    )
+    SELECT
+        dst_type, dst_id, archive_data, files_metadata, total_size,
+        compressed_size, files_count, p_created_by,
+        'Skopiowane z ' || src_type || ' ' || src_id, storage_type
+    FROM attachments
+    WHERE entity_type = src_type
+      AND entity_id = src_id;
+
+    GET DIAGNOSTICS copied = ROW_COUNT;
+    RETURN copied;
+END;
+$$;
+
+-- -----------------------------------------------------
+-- attachment_size_summary - sumy rozmiarów załączników encji
+-- -----------------------------------------------------
+-- Agregacja w bazie zamiast pobierania wszystkich wierszy do Pythona.
+-- Zwraca jeden wiersz (także gdy encja nie ma załączników).
+CREATE OR REPLACE FUNCTION attachment_size_summary(
+    p_entity_type attachments.entity_type%TYPE,
+    p_entity_id attachments.entity_id%TYPE
+)
+RETURNS TABLE (
+    total_size bigint,
+    compressed_size bigint,
+    files_count bigint,
+    attachments_count bigint
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        COALESCE(SUM(a.total_size), 0)::bigint,
+        COALESCE(SUM(a.compressed_size), 0)::bigint,
+        COALESCE(SUM(a.files_count), 0)::bigint,
+        COUNT(*)::bigint
+    FROM attachments a
+    WHERE a.entity_type = p_entity_type
+      AND a.entity_id = p_entity_id;
+$$;
+
+-- -----------------------------------------------------
+-- attachment_blobs - indeks treści plików w Supabase Storage (deduplikacja)
+-- -----------------------------------------------------
+-- content_hash (BLAKE2b-128 treści) -> storage_path pierwszego wysłanego
+-- pliku. add_files wskazuje istniejący obiekt zamiast wysyłać go ponownie.
+CREATE TABLE IF NOT EXISTS attachment_blobs (
+    content_hash TEXT PRIMARY KEY,
+    storage_path TEXT NOT NULL,
+    size BIGINT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_attachment_blobs_storage_path
+ON attachment_blobs(storage_path);
+
+-- -----------------------------------------------------
+-- storage_paths_in_use - ścieżki używane jeszcze przez inne załączniki
+-- -----------------------------------------------------
+-- Po deduplikacji lub copy_attachments kilka rekordów wskazuje ten sam plik
+-- w storage. delete_attachment usuwa tylko pliki, których nie zwróci ta
+-- funkcja. files_metadata może być tablicą JSON lub napisem z JSON-em.
+CREATE OR REPLACE FUNCTION storage_paths_in_use(
+    p_paths text[],
+    p_exclude_id attachments.id%TYPE
+)
+RETURNS SETOF text
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT DISTINCT elem->>'storage_path'
+    FROM attachments a
+    CROSS JOIN LATERAL (
+        SELECT CASE jsonb_typeof(a.files_metadata::jsonb)
+                   WHEN 'string' THEN (a.files_metadata::jsonb #>> '{}')::jsonb
+                   ELSE a.files_metadata::jsonb
+               END AS files
+    ) m
+    CROSS JOIN LATERAL jsonb_array_elements(m.files) AS elem
+    WHERE a.id <> p_exclude_id
+      AND a.storage_type = 'supabase_storage'
+      AND elem->>'storage_path' = ANY(p_paths);
+$$;
+
+-- -----------------------------------------------------
+-- storage_paths_used_by_other_entities - ścieżki używane przez inne encje
+-- -----------------------------------------------------
+-- Wariant storage_paths_in_use dla cleanup_entity_files: pomija wszystkie
+-- załączniki czyszczonej encji, więc wynik nie zależy od tego, czy jej
+-- rekordy zostały już usunięte.
+CREATE OR REPLACE FUNCTION storage_paths_used_by_other_entities(
+    p_paths text[],
+    p_entity_type attachments.entity_type%TYPE,
+    p_entity_id attachments.entity_id%TYPE
+)
+RETURNS SETOF text
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT DISTINCT elem->>'storage_path'
+    FROM attachments a
+    CROSS JOIN LATERAL (
+        SELECT CASE jsonb_typeof(a.files_metadata::jsonb)
+                   WHEN 'string' THEN (a.files_metadata::jsonb #>> '{}')::jsonb
+                   ELSE a.files_metadata::jsonb
+               END AS files
+    ) m
+    CROSS JOIN LATERAL jsonb_array_elements(m.files) AS elem
+    WHERE NOT (a.entity_type = p_entity_type AND a.entity_id = p_entity_id)
+      AND a.storage_type = 'supabase_storage'
+      AND elem->>'storage_path' = ANY(p_paths);
+$$;
+
+-- =====================================================
+-- Sprawdzenie
+-- =====================================================
+-- SELECT copy_attachments('quotation', '<id_oferty>', 'order', '<id_zamowienia>', NULL);
+-- SELECT * FROM attachment_size_summary('order', '<id_zamowienia>');
+-- SELECT * FROM storage_paths_in_use(ARRAY['order/<id>/attachments/<plik>'], '<id_zalacznika>');
+-- SELECT * FROM storage_paths_used_by_other_entities(ARRAY['order/<id>/attachments/<plik>'], 'order', '<id>');
@@ -56,6 +56,7 @@ setup(
     ],
     extras_require={
         "outlook": ["pywin32>=305"],
+        "speedups": ["orjson>=3.9.0", "xxhash>=3.0.0"],
         "dev": [
             "pytest>=7.4.0",
             "pytest-cov>=4.1.0",
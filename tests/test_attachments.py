@@ -0,0 +1,667 @@
+"""
+Unit tests for attachments helpers
+"""
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+from collections import OrderedDict
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import attachments_manager
+import attachments_storage
+from attachments_manager import AttachmentsManager, _files_metadata_list
+from attachments_storage import AttachmentsStorage, _file_ext, _stream_size
+
+
+class _FakeQuery:
+    """PostgREST query stub: records chained calls, execute() asks the client handler"""
+
+    def __init__(self, client, target):
+        self.client = client
+        self.target = target
+        self.ops = []
+
+    def __getattr__(self, name):
+        def op(*args, **kwargs):
+            self.ops.append((name, args))
+            return self
+        return op
+
+    def execute(self):
+        self.client.calls.append((self.target, self.ops))
+        handler = self.client.handlers.get(self.target)
+        result = handler(self.ops) if callable(handler) else handler
+        if isinstance(result, Exception):
+            raise result
+        return SimpleNamespace(data=result)
+
+
+class _FakeClient:
+    """In-memory Supabase client - handlers map 'table' or 'rpc:function' to data, an exception or a callable"""
+
+    def __init__(self, **handlers):
+        self.handlers = handlers
+        self.calls = []
+
+    def table(self, name):
+        return _FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        return _FakeQuery(self, f"rpc:{name}").params(params)
+
+    def rpc_params(self, name):
+        """Parameters of the last executed call of RPC function name"""
+        for target, ops in reversed(self.calls):
+            if target == f"rpc:{name}":
+                return ops[0][1][0]
+        return None
+
+
+def _manager(client):
+    """AttachmentsManager on a fake client with a mocked storage"""
+    with patch.object(attachments_manager, 'AttachmentsStorage'):
+        return AttachmentsManager(client)
+
+
+def _storage(client=None):
+    """AttachmentsStorage without the bucket check, with a mocked storage API"""
+    storage = AttachmentsStorage.__new__(AttachmentsStorage)
+    storage.client = client
+    storage.storage = MagicMock()
+    storage._signed_url_cache = OrderedDict()
+    storage._signed_url_lock = threading.Lock()
+    return storage
+
+
+class TestFormatSize(unittest.TestCase):
+    """Test AttachmentsManager._format_size"""
+
+    def test_unit_boundaries(self):
+        """Test sizes on both sides of each unit boundary"""
+        format_size = AttachmentsManager._format_size
+        self.assertEqual(format_size(0), "0.0 B")
+        self.assertEqual(format_size(1023), "1023.0 B")
+        self.assertEqual(format_size(1024), "1.0 KB")
+        self.assertEqual(format_size((1 << 20) - 1), "1024.0 KB")
+        self.assertEqual(format_size(1 << 20), "1.0 MB")
+        self.assertEqual(format_size(1 << 40), "1.0 TB")
+
+    def test_beyond_largest_unit(self):
+        """Test that sizes above TB stay in TB"""
+        self.assertEqual(AttachmentsManager._format_size(1 << 50), "1024.0 TB")
+
+    def test_fractional_size(self):
+        """Test that sizes below one byte do not fail"""
+        self.assertEqual(AttachmentsManager._format_size(0.5), "0.5 B")
+
+
+class TestFilesMetadataList(unittest.TestCase):
+    """Test attachments_manager._files_metadata_list"""
+
+    FILES = [{'filename': 'a.pdf', 'size': 10}, {'filename': 'b.dxf', 'size': 20}]
+
+    def test_list_passthrough(self):
+        """Test that an already parsed jsonb list is returned as is"""
+        self.assertIs(_files_metadata_list(self.FILES), self.FILES)
+
+    def test_json_string(self):
+        """Test parsing JSON text from a non-migrated database"""
+        self.assertEqual(_files_metadata_list(json.dumps(self.FILES)), self.FILES)
+
+    def test_json_bytes(self):
+        """Test parsing raw JSON bytes without decoding to str first"""
+        raw = json.dumps(self.FILES).encode()
+        self.assertEqual(_files_metadata_list(raw), self.FILES)
+        self.assertEqual(_files_metadata_list(bytearray(raw)), self.FILES)
+
+    def test_json_without_orjson(self):
+        """Test the standard json fallback when orjson is not installed"""
+        with patch.object(attachments_manager, 'ORJSON_AVAILABLE', False):
+            self.assertEqual(_files_metadata_list(json.dumps(self.FILES)), self.FILES)
+            self.assertEqual(_files_metadata_list(json.dumps(self.FILES).encode()), self.FILES)
+
+    def test_empty_values(self):
+        """Test that missing metadata gives an empty list"""
+        for raw in (None, '', b'', []):
+            self.assertEqual(_files_metadata_list(raw), [])
+
+
+class TestFileExt(unittest.TestCase):
+    """Test attachments_storage._file_ext and preview checks built on it"""
+
+    def test_matches_splitext(self):
+        """Test that the result matches os.path.splitext for typical names"""
+        cases = {
+            'drawing.DXF': 'dxf',
+            'archive.tar.gz': 'gz',
+            'folder/part.step': 'step',
+            'folder\\part.Pdf': 'pdf',
+            'README': '',
+            '.bashrc': '',
+            '..hidden.txt': 'txt',
+            'dir.v2/noext': '',
+        }
+        for filename, ext in cases.items():
+            self.assertEqual(_file_ext(filename), ext, filename)
+
+    def test_can_preview_file(self):
+        """Test preview check against the precomputed extension set"""
+        storage = AttachmentsStorage.__new__(AttachmentsStorage)
+        self.assertTrue(storage.can_preview_file('Offer.PDF'))
+        self.assertFalse(storage.can_preview_file('pdf'))
+        self.assertFalse(storage.can_preview_file('notes.unknownext'))
+
+
+class TestFindBlob(unittest.TestCase):
+    """Test AttachmentsManager._find_blob"""
+
+    def test_hit(self):
+        """Test that a known hash returns the stored path"""
+        manager = _manager(_FakeClient(attachment_blobs=[{'storage_path': 'order/1/a.pdf'}]))
+        self.assertEqual(manager._find_blob('abc'), 'order/1/a.pdf')
+
+    def test_transient_error_keeps_dedup(self):
+        """Test that a network error is a miss, not a permanent switch-off"""
+        manager = _manager(_FakeClient(attachment_blobs=TimeoutError('read timeout')))
+        self.assertIsNone(manager._find_blob('abc'))
+        self.assertTrue(manager._dedup_available)
+
+    def test_missing_table_disables_dedup(self):
+        """Test that a missing attachment_blobs table switches dedup off"""
+        error = Exception('relation "public.attachment_blobs" does not exist')
+        manager = _manager(_FakeClient(attachment_blobs=error))
+        self.assertIsNone(manager._find_blob('abc'))
+        self.assertFalse(manager._dedup_available)
+        self.assertIsNone(manager._find_blob('abc'))
+        self.assertEqual(len(manager.client.calls), 1)
+
+
+class TestContentDedup(unittest.TestCase):
+    """Test content-hash dedup on upload and shared files on delete"""
+
+    def setUp(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        self.file_path = os.path.join(temp_dir, 'datasheet.pdf')
+        with open(self.file_path, 'wb') as f:
+            f.write(b'%PDF-1.4 datasheet')
+
+    def test_known_content_is_not_uploaded(self):
+        """Test that a file with known content points at the stored object"""
+        manager = _manager(_FakeClient(attachment_blobs=[{'storage_path': 'quotation/9/attachments/x.pdf'}]))
+        metadata, uploaded = manager._upload_single_file(self.file_path, 'order', '1', 'now')
+        self.assertFalse(uploaded)
+        self.assertEqual(metadata.storage_path, 'quotation/9/attachments/x.pdf')
+        manager.storage.upload_file.assert_not_called()
+
+    def test_new_content_is_registered(self):
+        """Test that an uploaded file is added to the dedup index"""
+        client = _FakeClient(attachment_blobs=[])
+        manager = _manager(client)
+        manager.storage.upload_file.return_value = {'storage_path': 'order/1/attachments/d.pdf'}
+        metadata, uploaded = manager._upload_single_file(self.file_path, 'order', '1', 'now')
+        self.assertTrue(uploaded)
+        inserts = [ops for target, ops in client.calls
+                   if target == 'attachment_blobs' and ops[0][0] == 'insert']
+        row = inserts[0][0][1][0]
+        self.assertEqual(row['storage_path'], 'order/1/attachments/d.pdf')
+        self.assertEqual(row['size'], os.path.getsize(self.file_path))
+        with open(self.file_path, 'rb') as f:
+            self.assertEqual(row['content_hash'], attachments_manager._content_hash(f))
+
+    def test_delete_keeps_shared_files(self):
+        """Test that delete_attachment removes only files no one else uses"""
+        files = [{'filename': 'a.pdf', 'storage_path': 'order/1/a.pdf'},
+                 {'filename': 'b.pdf', 'storage_path': 'order/1/b.pdf'}]
+        client = _FakeClient(**{
+            'attachments': [{'files_metadata': files, 'storage_type': 'supabase_storage'}],
+            'attachment_blobs': [],
+            'rpc:storage_paths_in_use': ['order/1/b.pdf'],
+        })
+        manager = _manager(client)
+        self.assertTrue(manager.delete_attachment('att-1'))
+        manager.storage.delete_files.assert_called_once_with(['order/1/a.pdf'])
+        self.assertEqual(client.rpc_params('storage_paths_in_use')['p_exclude_id'], 'att-1')
+
+    def test_delete_keeps_files_without_check(self):
+        """Test that files stay in storage when the in-use check fails"""
+        files = [{'filename': 'a.pdf', 'storage_path': 'order/1/a.pdf'}]
+        client = _FakeClient(**{
+            'attachments': [{'files_metadata': files, 'storage_type': 'supabase_storage'}],
+            'rpc:storage_paths_in_use': Exception('PGRST202'),
+        })
+        manager = _manager(client)
+        self.assertTrue(manager.delete_attachment('att-1'))
+        manager.storage.delete_files.assert_not_called()
+
+
+class TestCopyAttachments(unittest.TestCase):
+    """Test AttachmentsManager.copy_attachments RPC and client-side fallback"""
+
+    SOURCE_ROWS = [
+        {'id': 's1', 'files_metadata': [], 'total_size': 10, 'compressed_size': 0,
+         'files_count': 1, 'storage_type': 'supabase_storage'},
+        {'id': 's2', 'files_metadata': [], 'total_size': 20, 'compressed_size': 15,
+         'files_count': 2, 'storage_type': 'bytea'},
+    ]
+
+    @staticmethod
+    def _attachments_handler(ops):
+        if ops[0][0] == 'insert':
+            return ops[0][1][0]
+        if ('in_', ('id', ['s2'])) in ops:
+            return [{'id': 's2', 'archive_data': '\\x504b'}]
+        return TestCopyAttachments.SOURCE_ROWS
+
+    def _copy(self, client):
+        return _manager(client).copy_attachments('quotation', 'q1', 'order', 'o1', 'jan')
+
+    def test_rpc(self):
+        """Test that the server-side copy is used when available"""
+        client = _FakeClient(**{'rpc:copy_attachments': 3})
+        self.assertEqual(self._copy(client), 3)
+        self.assertEqual(client.rpc_params('copy_attachments'), {
+            'src_type': 'quotation', 'src_id': 'q1',
+            'dst_type': 'order', 'dst_id': 'o1', 'p_created_by': 'jan'
+        })
+        self.assertEqual(len(client.calls), 1)
+
+    def test_missing_function_falls_back(self):
+        """Test the single-request client-side copy without the RPC"""
+        error = Exception("{'code': 'PGRST202', 'message': 'Could not find the function'}")
+        client = _FakeClient(**{'rpc:copy_attachments': error, 'attachments': self._attachments_handler})
+        self.assertEqual(self._copy(client), 2)
+        inserts = [ops for target, ops in client.calls
+                   if target == 'attachments' and ops[0][0] == 'insert']
+        self.assertEqual(len(inserts), 1)
+        rows = inserts[0][0][1][0]
+        self.assertEqual([row['entity_id'] for row in rows], ['o1', 'o1'])
+        self.assertEqual([row['archive_data'] for row in rows], [None, '\\x504b'])
+
+    def test_other_errors_do_not_fall_back(self):
+        """Test that a timeout does not copy again on the client"""
+        client = _FakeClient(**{'rpc:copy_attachments': TimeoutError('read timeout'),
+                                'attachments': self._attachments_handler})
+        self.assertEqual(self._copy(client), 0)
+        self.assertEqual([target for target, _ in client.calls], ['rpc:copy_attachments'])
+
+
+class TestExtractAllToTempParallel(unittest.TestCase):
+    """Test AttachmentsManager.extract_all_to_temp_parallel"""
+
+    def _extract(self, client, download_file_stream=None):
+        manager = _manager(client)
+        manager.storage.download_file_stream.side_effect = download_file_stream
+        self.addCleanup(lambda: manager._extract_executor and manager._extract_executor.shutdown())
+        temp_dir = manager.extract_all_to_temp_parallel('att-1')
+        if temp_dir:
+            self.addCleanup(shutil.rmtree, temp_dir, True)
+        return manager, temp_dir
+
+    def test_legacy_archive_with_subfolders(self):
+        """Test parallel extraction of many members sharing folders"""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as zip_file:
+            for index in range(40):
+                zip_file.writestr(f"drawings/sub{index % 3}/part{index}.dxf", f"part {index}")
+        client = _FakeClient(attachments=[{
+            'files_metadata': [], 'storage_type': 'bytea', 'archive_data': buffer.getvalue()
+        }])
+        _, temp_dir = self._extract(client)
+        self.assertIsNotNone(temp_dir)
+        with open(os.path.join(temp_dir, 'drawings', 'sub1', 'part7.dxf')) as f:
+            self.assertEqual(f.read(), 'part 7')
+        extracted = sum(len(files) for _, _, files in os.walk(temp_dir))
+        self.assertEqual(extracted, 40)
+
+    def test_storage_files_with_same_name(self):
+        """Test that files with one basename do not overwrite each other"""
+        files = [
+            {'filename': 'rysunek.pdf', 'storage_path': 'order/1/a'},
+            {'filename': 'Rysunek.pdf', 'storage_path': 'order/1/b'},
+            {'filename': 'inny.pdf', 'storage_path': 'order/1/c'},
+        ]
+        client = _FakeClient(attachments=[{'files_metadata': files, 'storage_type': 'supabase_storage'}])
+
+        def download_file_stream(storage_path, dst):
+            dst.write(storage_path.encode())
+            return True
+        _, temp_dir = self._extract(client, download_file_stream)
+        contents = {}
+        for name in os.listdir(temp_dir):
+            with open(os.path.join(temp_dir, name)) as f:
+                contents[name] = f.read()
+        self.assertEqual(sorted(contents.values()), ['order/1/a', 'order/1/b', 'order/1/c'])
+        self.assertEqual(contents['rysunek.pdf'], 'order/1/a')
+
+    def test_failure_removes_temp_dir(self):
+        """Test that a broken archive leaves no temporary folder behind"""
+        client = _FakeClient(attachments=[{
+            'files_metadata': [], 'storage_type': 'bytea', 'archive_data': b'not a zip'
+        }])
+        created = []
+        real_mkdtemp = tempfile.mkdtemp
+
+        def mkdtemp(**kwargs):
+            created.append(real_mkdtemp(**kwargs))
+            return created[-1]
+        with patch.object(attachments_manager.tempfile, 'mkdtemp', side_effect=mkdtemp):
+            _, temp_dir = self._extract(client)
+        self.assertIsNone(temp_dir)
+        self.assertEqual(len(created), 1)
+        self.assertFalse(os.path.exists(created[0]))
+
+
+class TestMetadataCache(unittest.TestCase):
+    """Test the files_metadata LRU cache of AttachmentsManager"""
+
+    FILES = [{'filename': 'a.pdf', 'size': 1, 'type': 'application/pdf', 'storage_path': 'order/1/a.pdf'}]
+
+    def setUp(self):
+        self.client = _FakeClient(attachments=[
+            {'files_metadata': self.FILES, 'storage_type': 'supabase_storage'}
+        ])
+        self.manager = _manager(self.client)
+
+    def _selects(self):
+        return [ops for target, ops in self.client.calls
+                if target == 'attachments' and ops[0][0] == 'select']
+
+    def test_metadata_is_fetched_once(self):
+        """Test that list, preview and download reuse one query"""
+        self.assertEqual([f.filename for f in self.manager.get_files_list('att-1')], ['a.pdf'])
+        self.manager.storage.download_file.return_value = b'data'
+        self.assertEqual(self.manager.extract_file('att-1', 'a.pdf'), b'data')
+        self.manager.storage.download_file.assert_called_once_with('order/1/a.pdf')
+        self.assertEqual(len(self._selects()), 1)
+
+    def test_delete_forgets_metadata(self):
+        """Test that a deleted attachment is read from the database again"""
+        self.client.handlers['rpc:storage_paths_in_use'] = []
+        self.client.handlers['attachment_blobs'] = []
+        self.manager.get_files_list('att-1')
+        self.manager.delete_attachment('att-1')
+        self.assertNotIn('att-1', self.manager._metadata_cache)
+        self.manager.get_files_list('att-1')
+        self.assertEqual(len(self._selects()), 2)
+
+    def test_cache_size_is_bounded(self):
+        """Test that the least recently used attachment is evicted"""
+        self.manager.METADATA_CACHE_SIZE = 2
+        for attachment_id in ('a', 'b', 'a', 'c'):
+            self.manager.get_files_list(attachment_id)
+        self.assertEqual(list(self.manager._metadata_cache), ['a', 'c'])
+        self.assertEqual(len(self._selects()), 3)
+
+    def test_missing_attachment_is_not_cached(self):
+        """Test that an unknown id is not remembered as empty"""
+        self.client.handlers['attachments'] = []
+        self.assertEqual(self.manager.get_files_list('missing'), [])
+        self.assertNotIn('missing', self.manager._metadata_cache)
+
+
+class TestSignedUrlCache(unittest.TestCase):
+    """Test the signed-URL LRU cache of AttachmentsStorage"""
+
+    def setUp(self):
+        self.storage = _storage()
+        self.bucket = self.storage.storage.from_.return_value
+        self.bucket.create_signed_url.side_effect = lambda path, expires_in: {'signedURL': f"url:{path}"}
+        self.bucket.create_signed_urls.side_effect = lambda paths, expires_in: [
+            {'path': path, 'signedURL': f"url:{path}"} for path in paths
+        ]
+
+    def test_single_url_is_reused(self):
+        """Test that a second request for the same file is served from cache"""
+        self.assertEqual(self.storage.get_signed_url('a.pdf'), 'url:a.pdf')
+        self.assertEqual(self.storage.get_signed_url('a.pdf'), 'url:a.pdf')
+        self.bucket.create_signed_url.assert_called_once()
+
+    def test_expired_url_is_renewed(self):
+        """Test that a URL past its reuse window is generated again"""
+        self.storage.get_signed_url('a.pdf', expires_in=60)
+        with patch.object(attachments_storage.time, 'monotonic', return_value=time.monotonic() + 60):
+            self.storage.get_signed_url('a.pdf', expires_in=60)
+        self.assertEqual(self.bucket.create_signed_url.call_count, 2)
+
+    def test_batch_requests_only_misses(self):
+        """Test that the bulk call asks only for URLs not in cache"""
+        self.storage.get_signed_url('a.pdf')
+        urls = self.storage.get_signed_urls(['a.pdf', 'b.pdf'])
+        self.assertEqual(urls, {'a.pdf': 'url:a.pdf', 'b.pdf': 'url:b.pdf'})
+        self.bucket.create_signed_urls.assert_called_once_with(['b.pdf'], 3600)
+
+    def test_batch_failure_keeps_cached_urls(self):
+        """Test that a failed bulk call still returns cached URLs"""
+        self.storage.get_signed_url('a.pdf')
+        self.bucket.create_signed_urls.side_effect = ConnectionError('offline')
+        self.assertEqual(self.storage.get_signed_urls(['a.pdf', 'b.pdf']), {'a.pdf': 'url:a.pdf'})
+
+    def test_deleted_file_is_forgotten(self):
+        """Test that deleting a file drops its cached URL"""
+        self.storage.get_signed_url('a.pdf')
+        self.storage.delete_files(['a.pdf'])
+        self.storage.get_signed_url('a.pdf')
+        self.assertEqual(self.bucket.create_signed_url.call_count, 2)
+
+    def test_cache_size_is_bounded(self):
+        """Test that the least recently used URL is evicted"""
+        with patch.object(AttachmentsStorage, 'SIGNED_URL_CACHE_SIZE', 2):
+            for path in ('a.pdf', 'b.pdf', 'c.pdf'):
+                self.storage.get_signed_url(path)
+        self.assertEqual([key[0] for key in self.storage._signed_url_cache], ['b.pdf', 'c.pdf'])
+
+
+class TestUploadHashing(unittest.TestCase):
+    """Test that an uploaded file is hashed once"""
+
+    def setUp(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        self.file_path = os.path.join(temp_dir, 'datasheet.pdf')
+        with open(self.file_path, 'wb') as f:
+            f.write(b'%PDF-1.4 test')
+
+    def test_manager_passes_content_hash(self):
+        """Test that the dedup hash is reused for the storage path"""
+        manager = _manager(_FakeClient(attachment_blobs=[]))
+        manager.storage.upload_file.return_value = {'storage_path': 'order/1/attachments/x'}
+        manager._upload_single_file(self.file_path, 'order', '1', '2025-01-01T00:00:00')
+        with open(self.file_path, 'rb') as f:
+            expected = attachments_manager._content_hash(f)
+        self.assertEqual(manager.storage.upload_file.call_args.kwargs['content_hash'], expected)
+
+    def test_storage_skips_path_hash(self):
+        """Test that upload_file does not re-read the file when given a hash"""
+        storage = AttachmentsStorage.__new__(AttachmentsStorage)
+        storage.storage = MagicMock()
+        with open(self.file_path, 'rb') as f, \
+                patch.object(attachments_storage, '_path_hash', side_effect=AssertionError):
+            result = storage.upload_file(f, 'datasheet.pdf', 'order', '1',
+                                         sign_url=False, content_hash='0123456789abcdef')
+        self.assertIn('_01234567_datasheet.pdf', result['storage_path'])
+
+
+class TestCleanupEntityFiles(unittest.TestCase):
+    """Test AttachmentsStorage.cleanup_entity_files"""
+
+    def _storage(self, client):
+        storage = AttachmentsStorage.__new__(AttachmentsStorage)
+        storage.client = client
+        storage.storage = MagicMock()
+        storage.storage.from_.return_value.list.return_value = [
+            {'name': 'a.pdf', 'id': '1'},
+            {'name': 'shared.pdf', 'id': '2'},
+        ]
+        storage.delete_files = MagicMock(return_value=True)
+        return storage
+
+    def test_keeps_files_used_by_other_entities(self):
+        """Test that only files referenced elsewhere are kept"""
+        client = _FakeClient(**{
+            'rpc:storage_paths_used_by_other_entities': ['order/7/shared.pdf'],
+            'attachment_blobs': [],
+        })
+        storage = self._storage(client)
+        self.assertEqual(storage.cleanup_entity_files('order', '7'), 1)
+        storage.delete_files.assert_called_once_with(['order/7/a.pdf'])
+        params = client.rpc_params('storage_paths_used_by_other_entities')
+        self.assertEqual((params['p_entity_type'], params['p_entity_id']), ('order', '7'))
+
+    def test_keeps_everything_without_check(self):
+        """Test that nothing is deleted when the in-use check fails"""
+        client = _FakeClient(**{'rpc:storage_paths_used_by_other_entities': Exception('PGRST202')})
+        storage = self._storage(client)
+        self.assertEqual(storage.cleanup_entity_files('order', '7'), 0)
+        storage.delete_files.assert_not_called()
+
+
+class TestPreviewFiles(unittest.TestCase):
+    """Test the per-process preview directory of open_file_with_default_app"""
+
+    def setUp(self):
+        self.temp_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_root)
+        patcher = patch.object(attachments_storage.tempfile, 'tempdir', self.temp_root)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(attachments_storage, '_preview_dir', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _dir(self, name, age):
+        path = os.path.join(self.temp_root, name)
+        os.mkdir(path)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_preview_written_to_preview_dir(self):
+        """Test that the opened file lands in the process preview directory"""
+        storage = AttachmentsStorage.__new__(AttachmentsStorage)
+        with patch.object(attachments_storage.platform, 'system', return_value='Linux'), \
+                patch.object(attachments_storage.subprocess, 'Popen') as popen:
+            self.assertTrue(storage.open_file_with_default_app(b'data', 'offer.pdf'))
+        opened = popen.call_args.args[0][1]
+        self.assertEqual(os.path.dirname(opened), attachments_storage._preview_dir)
+        self.assertTrue(os.path.basename(attachments_storage._preview_dir).startswith(
+            attachments_storage._PREVIEW_DIR_PREFIX))
+
+    def test_sweeps_only_stale_preview_dirs(self):
+        """Test that leftovers of old sessions go and other folders stay"""
+        prefix = attachments_storage._PREVIEW_DIR_PREFIX
+        stale = self._dir(prefix + 'old', age=2 * attachments_storage._PREVIEW_DIR_MAX_AGE)
+        fresh = self._dir(prefix + 'new', age=0)
+        other = self._dir('other_old', age=2 * attachments_storage._PREVIEW_DIR_MAX_AGE)
+        attachments_storage._sweep_preview_dirs()
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(fresh))
+        self.assertTrue(os.path.exists(other))
+
+
+class TestAddFiles(unittest.TestCase):
+    """Test parallel AttachmentsManager.add_files with progress and cancel"""
+
+    def setUp(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        self.paths = []
+        for index, size in enumerate((100, 200, 300)):
+            path = os.path.join(temp_dir, f"part{index}.dxf")
+            with open(path, 'wb') as f:
+                f.write(bytes([index]) * size)
+            self.paths.append(path)
+        self.client = _FakeClient(attachments=[{'id': 'new'}], attachment_blobs=[])
+        self.manager = _manager(self.client)
+        self.addCleanup(self._shutdown)
+
+        def upload_file(file_data, filename, **kwargs):
+            return {'storage_path': f"order/1/attachments/{filename}"}
+        self.manager.storage.upload_file.side_effect = upload_file
+        self.manager.storage.delete_files.return_value = True
+
+    def _shutdown(self):
+        if self.manager._upload_executor is not None:
+            self.manager._upload_executor.shutdown()
+
+    def _inserted_rows(self):
+        return [ops for target, ops in self.client.calls
+                if target == 'attachments' and ops[0][0] == 'insert']
+
+    def test_uploads_all_files_and_reports_progress(self):
+        """Test that every file is uploaded and progress reaches the total"""
+        progress = []
+        result = self.manager.add_files('order', '1', self.paths,
+                                        progress_callback=lambda done, total: progress.append((done, total)))
+        self.assertEqual(result, {'id': 'new'})
+        self.assertEqual(self.manager.storage.upload_file.call_count, 3)
+        self.assertEqual(len(progress), 3)
+        self.assertEqual(max(progress), (600, 600))
+        row = self._inserted_rows()[0][0][1][0]
+        self.assertEqual(row['total_size'], 600)
+        self.assertEqual([m['filename'] for m in row['files_metadata']],
+                         ['part0.dxf', 'part1.dxf', 'part2.dxf'])
+
+    def test_cancel_during_upload_discards_files(self):
+        """Test that a cancel after all uploads started inserts nothing"""
+        cancel_event = threading.Event()
+        all_started = threading.Barrier(len(self.paths))
+
+        def upload_file(file_data, filename, **kwargs):
+            all_started.wait(timeout=5)
+            cancel_event.set()
+            return {'storage_path': f"order/1/attachments/{filename}"}
+        self.manager.storage.upload_file.side_effect = upload_file
+
+        result = self.manager.add_files('order', '1', self.paths, cancel_event=cancel_event)
+        self.assertIsNone(result)
+        self.assertEqual(self._inserted_rows(), [])
+        deleted = self.manager.storage.delete_files.call_args.args[0]
+        self.assertEqual(sorted(deleted), [f"order/1/attachments/part{i}.dxf" for i in range(3)])
+
+    def test_failed_upload_discards_other_files(self):
+        """Test that one failed upload removes the files already sent"""
+        self.manager.storage.upload_file.side_effect = lambda file_data, filename, **kwargs: (
+            None if filename == 'part1.dxf' else {'storage_path': f"order/1/attachments/{filename}"}
+        )
+        self.assertIsNone(self.manager.add_files('order', '1', self.paths))
+        self.assertEqual(self._inserted_rows(), [])
+        deleted = self.manager.storage.delete_files.call_args.args[0]
+        self.assertEqual(sorted(deleted), ['order/1/attachments/part0.dxf', 'order/1/attachments/part2.dxf'])
+
+    def test_missing_file(self):
+        """Test that a missing file fails before any upload"""
+        self.assertIsNone(self.manager.add_files('order', '1', self.paths + ['/nonexistent/x.dxf']))
+        self.manager.storage.upload_file.assert_not_called()
+
+
+class TestStreamSize(unittest.TestCase):
+    """Test attachments_storage._stream_size"""
+
+    def test_stream_without_fileno(self):
+        """Test that in-memory streams are sized and keep their position"""
+        stream = io.BytesIO(b"abcdef")
+        stream.read(2)
+        self.assertEqual(_stream_size(stream), 6)
+        self.assertEqual(stream.tell(), 2)
+
+    def test_upload_in_memory_stream(self):
+        """Test that upload_file sends an in-memory stream as bytes"""
+        storage = AttachmentsStorage.__new__(AttachmentsStorage)
+        storage.storage = MagicMock()
+        result = storage.upload_file(io.BytesIO(b'%PDF-1.4'), 'offer.pdf', 'order', '1', sign_url=False)
+        self.assertEqual(result['size'], 8)
+        bucket = storage.storage.from_.return_value
+        self.assertEqual(bucket.upload.call_args.kwargs['file'], b'%PDF-1.4')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+"""
+Unit tests for attachments GUI helpers
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from collections import deque
+from unittest.mock import MagicMock
+
+from attachments_gui_widgets import ConfirmDialog, _PARALLEL_STAT_THRESHOLD, _Row, _selection_total_size
+from attachments_manager import AttachmentInfo, FileMetadata, format_file_size
+
+
+class TestSelectionTotalSize(unittest.TestCase):
+    """Test _selection_total_size"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.paths = []
+        for index, size in enumerate((10, 20, 30)):
+            path = os.path.join(self.temp_dir, f"file{index}.bin")
+            with open(path, 'wb') as f:
+                f.write(b'x' * size)
+            self.paths.append(path)
+
+    def test_single_directory(self):
+        """Test summing files from one directory"""
+        self.assertEqual(_selection_total_size(self.paths, limit=1000), 60)
+
+    def test_several_directories(self):
+        """Test summing files from different directories"""
+        sub_dir = os.path.join(self.temp_dir, 'sub')
+        os.mkdir(sub_dir)
+        other = os.path.join(sub_dir, 'other.bin')
+        with open(other, 'wb') as f:
+            f.write(b'x' * 5)
+        self.assertEqual(_selection_total_size(self.paths + [other], limit=1000), 65)
+
+    def test_many_files_in_several_directories(self):
+        """Test the thread-pool stat path for large selections"""
+        paths = []
+        for index in range(_PARALLEL_STAT_THRESHOLD + 8):
+            sub_dir = os.path.join(self.temp_dir, f"dir{index % 2}")
+            os.makedirs(sub_dir, exist_ok=True)
+            path = os.path.join(sub_dir, f"file{index}.bin")
+            with open(path, 'wb') as f:
+                f.write(b'x' * 3)
+            paths.append(path)
+        self.assertEqual(_selection_total_size(paths, limit=1 << 20), 3 * len(paths))
+
+    def test_stops_after_limit(self):
+        """Test that summing stops once the limit is exceeded"""
+        self.assertEqual(_selection_total_size(self.paths, limit=15), 30)
+
+
+class TestRowFilesStr(unittest.TestCase):
+    """Test _Row.files_str"""
+
+    @staticmethod
+    def _row(filenames):
+        files = [FileMetadata(filename=name, size=1, type='application/pdf') for name in filenames]
+        return _Row(AttachmentInfo(
+            id='1', entity_type='order', entity_id='2', files_metadata=files,
+            total_size=len(files), compressed_size=0, files_count=len(files),
+            created_at='2025-01-01T00:00:00'
+        ))
+
+    def test_short_list(self):
+        """Test that a short file list is shown in full"""
+        self.assertEqual(self._row(['a.pdf', 'b.dxf']).files_str, 'a.pdf, b.dxf')
+
+    def test_truncated_list(self):
+        """Test that a long file list is cut to the column width"""
+        files_str = self._row([f"drawing_{i:03d}.dxf" for i in range(50)]).files_str
+        self.assertEqual(len(files_str), _Row.FILES_STR_MAX_LEN)
+        self.assertTrue(files_str.endswith('…'))
+        self.assertTrue(files_str.startswith('drawing_000.dxf, drawing_001.dxf'))
+
+    def test_size_str(self):
+        """Test that the size column uses the shared size formatting"""
+        self.assertEqual(self._row(['a.pdf', 'b.dxf']).size_str, format_file_size(2))
+
+
+class TestConfirmDialog(unittest.TestCase):
+    """Test ConfirmDialog grab handling and queued questions (Tk calls mocked)"""
+
+    def setUp(self):
+        dialog = ConfirmDialog.__new__(ConfirmDialog)
+        dialog._on_confirm = None
+        dialog._previous_grab = None
+        dialog._pending = deque()
+        dialog.message_label = MagicMock()
+        for name in ('title', 'transient', 'deiconify', 'lift', 'grab_set',
+                     'grab_release', 'focus_set', 'withdraw', 'grab_current'):
+            setattr(dialog, name, MagicMock())
+        dialog.winfo_exists = MagicMock(return_value=True)
+        self.dialog = dialog
+        ConfirmDialog._instance = dialog
+        self.addCleanup(setattr, ConfirmDialog, '_instance', None)
+
+    def test_restores_previous_grab(self):
+        """Test that a modal parent gets its grab back after the answer"""
+        modal = MagicMock()
+        self.dialog.grab_current.return_value = modal
+        ConfirmDialog.ask(MagicMock(), "Potwierdzenie", "Usunąć?", MagicMock())
+        self.dialog._answer(False)
+        modal.grab_set.assert_called_once()
+
+    def test_second_question_is_queued(self):
+        """Test that a second ask does not replace the pending callback"""
+        first, second = MagicMock(), MagicMock()
+        ConfirmDialog.ask(MagicMock(), "1", "Pierwsze?", first)
+        ConfirmDialog.ask(MagicMock(), "2", "Drugie?", second)
+        self.dialog._answer(True)
+        first.assert_called_once()
+        second.assert_not_called()
+        self.assertIs(self.dialog._on_confirm, second)
+        self.dialog._answer(True)
+        second.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
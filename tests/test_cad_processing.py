@@ -0,0 +1,219 @@
+"""
+Unit tests for CAD processing helpers
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import cad_processing
+from cad_processing import CADProcessor
+
+
+class TestDwgCachePath(unittest.TestCase):
+    """Test CADProcessor._dwg_cache_path"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.dwg_path = os.path.join(self.temp_dir, 'part.dwg')
+        with open(self.dwg_path, 'wb') as f:
+            f.write(b'AC1032' + b'\0' * 100)
+
+    def test_stable_for_unchanged_file(self):
+        """Test that the same file maps to the same cached DXF"""
+        cache_dir = os.path.join(self.temp_dir, 'cache')
+        path = CADProcessor._dwg_cache_path(self.dwg_path, cache_dir)
+        self.assertEqual(os.path.dirname(path), cache_dir)
+        self.assertTrue(path.endswith('.dxf'))
+        self.assertEqual(CADProcessor._dwg_cache_path(self.dwg_path, cache_dir), path)
+
+    def test_changes_with_content(self):
+        """Test that modified content maps to a different cached DXF"""
+        before = CADProcessor._dwg_cache_path(self.dwg_path, self.temp_dir)
+        with open(self.dwg_path, 'ab') as f:
+            f.write(b'more')
+        self.assertNotEqual(CADProcessor._dwg_cache_path(self.dwg_path, self.temp_dir), before)
+
+
+class TestPruneDwgCache(unittest.TestCase):
+    """Test CADProcessor._prune_dwg_cache"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def _cached(self, name, age):
+        path = os.path.join(self.cache_dir, name)
+        with open(path, 'w') as f:
+            f.write('0\nEOF\n')
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_removes_only_stale_dxf(self):
+        """Test that old conversions go and recent or foreign files stay"""
+        stale = self._cached('old.dxf', age=3600)
+        fresh = self._cached('new.dxf', age=0)
+        other = self._cached('notes.txt', age=3600)
+        self.assertEqual(CADProcessor._prune_dwg_cache(self.cache_dir, max_age=60), 1)
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(fresh))
+        self.assertTrue(os.path.exists(other))
+
+    def test_cache_hit_refreshes_mtime(self):
+        """Test that a used conversion survives the next prune"""
+        path = self._cached('used.dxf', age=3600)
+        self.assertTrue(CADProcessor._touch_cached(path))
+        self.assertEqual(CADProcessor._prune_dwg_cache(self.cache_dir, max_age=60), 0)
+        self.assertFalse(CADProcessor._touch_cached(os.path.join(self.cache_dir, 'missing.dxf')))
+
+    def test_missing_cache_dir(self):
+        """Test that pruning a cache that was never created is a no-op"""
+        missing = os.path.join(self.cache_dir, 'missing')
+        self.assertEqual(CADProcessor._prune_dwg_cache(missing, max_age=60), 0)
+
+
+class TestConvertDwgFolder(unittest.TestCase):
+    """Test CADProcessor.convert_dwg_folder_to_dxf with a fake ODA converter"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.cache_dir = os.path.join(self.temp_dir, 'cache')
+        self.dwg_paths = []
+        for folder in ('a', 'b'):
+            os.mkdir(os.path.join(self.temp_dir, folder))
+            path = os.path.join(self.temp_dir, folder, 'part.dwg')
+            with open(path, 'wb') as f:
+                f.write(folder.encode() * 10)
+            self.dwg_paths.append(path)
+
+        patcher = patch.object(cad_processing, 'ODA_CONVERTER', self.dwg_paths[0])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(cad_processing.subprocess, 'run', side_effect=self._fake_oda)
+        self.run_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _fake_oda(args, **kwargs):
+        input_dir, output_dir = args[1], args[2]
+        for name in os.listdir(input_dir):
+            with open(os.path.join(input_dir, name), 'rb') as src:
+                data = src.read()
+            with open(os.path.join(output_dir, os.path.splitext(name)[0] + '.dxf'), 'wb') as dst:
+                dst.write(b'DXF:' + data)
+
+    def test_one_converter_run_for_batch(self):
+        """Test that same-named files from many folders convert in one run"""
+        converted = CADProcessor.convert_dwg_folder_to_dxf(self.dwg_paths + self.dwg_paths[:1], self.cache_dir)
+        self.assertEqual(self.run_mock.call_count, 1)
+        self.assertEqual(set(converted), set(self.dwg_paths))
+        with open(converted[self.dwg_paths[1]], 'rb') as f:
+            self.assertEqual(f.read(), b'DXF:' + b'b' * 10)
+
+    def test_cached_files_skip_converter(self):
+        """Test that a second batch is served from the cache"""
+        first = CADProcessor.convert_dwg_folder_to_dxf(self.dwg_paths, self.cache_dir)
+        second = CADProcessor.convert_dwg_folder_to_dxf(self.dwg_paths, self.cache_dir)
+        self.assertEqual(first, second)
+        self.assertEqual(self.run_mock.call_count, 1)
+        self.assertEqual(CADProcessor._dwg_to_dxf_cached(self.dwg_paths[0], self.cache_dir),
+                         first[self.dwg_paths[0]])
+
+    def test_missing_output_is_skipped(self):
+        """Test that a file the converter could not handle is left out"""
+        def partial_oda(args, **kwargs):
+            self._fake_oda(args)
+            os.remove(os.path.join(args[2], '1.dxf'))
+        self.run_mock.side_effect = partial_oda
+        converted = CADProcessor.convert_dwg_folder_to_dxf(self.dwg_paths, self.cache_dir)
+        self.assertEqual(list(converted), [self.dwg_paths[0]])
+
+
+class TestProcessCadFilesBatch(unittest.TestCase):
+    """Test CADProcessor.process_cad_files_batch"""
+
+    JOBS = [
+        ('a.dwg', 'a_hi.png', 'a_lo.png'),
+        ('b.step', 'b_hi.png', 'b_lo.png'),
+        ('c.dwg', 'c_hi.png', 'c_lo.png'),
+    ]
+
+    @staticmethod
+    def _convert(cad_path, high_res_output, low_res_output):
+        if cad_path == 'b.step':
+            raise RuntimeError('broken file')
+        return True, cad_path == 'a.dwg'
+
+    def _batch(self, max_workers):
+        with patch.object(CADProcessor, 'process_cad_file_both_resolutions', side_effect=self._convert), \
+                patch.object(CADProcessor, 'convert_dwg_folder_to_dxf') as convert_dwg, \
+                patch.object(CADProcessor, '_prune_dwg_cache'), \
+                patch.object(cad_processing, 'ProcessPoolExecutor', ThreadPoolExecutor):
+            results = CADProcessor.process_cad_files_batch(self.JOBS, max_workers=max_workers)
+        convert_dwg.assert_called_once_with(['a.dwg', 'c.dwg'])
+        return results
+
+    def test_results_in_job_order(self):
+        """Test that pool results keep job order and failures become (False, False)"""
+        self.assertEqual(self._batch(max_workers=3), [(True, True), (False, False), (True, False)])
+
+    def test_empty_batch(self):
+        """Test that an empty batch starts nothing"""
+        self.assertEqual(CADProcessor.process_cad_files_batch([]), [])
+
+
+class TestRenderDxf(unittest.TestCase):
+    """Test CADProcessor._render_dxf backend selection"""
+
+    def _render(self, backend):
+        drawing = MagicMock()
+        pymupdf_addon = MagicMock()
+        pymupdf_addon.PyMuPdfBackend.return_value = backend
+        modules = {
+            'pymupdf': MagicMock(),
+            'ezdxf': MagicMock(),
+            'ezdxf.addons': MagicMock(),
+            'ezdxf.addons.drawing': drawing,
+            'ezdxf.addons.drawing.pymupdf': pymupdf_addon,
+        }
+        with patch.dict(sys.modules, modules), \
+                patch.object(cad_processing, 'PYMUPDF_AVAILABLE', True), \
+                patch.object(cad_processing.Image, 'open', MagicMock()) as image_open, \
+                patch.object(CADProcessor, '_save_png') as save_png, \
+                patch.object(CADProcessor, '_process_dxf_with_matplotlib') as fallback:
+            ok = CADProcessor._render_dxf(MagicMock(), MagicMock(), 200, 100, 'out.png', dpi=150)
+        return ok, image_open, save_png, fallback
+
+    def test_pixmap_without_pdf_round_trip(self):
+        """Test that the PyMuPDF pixmap path is taken, not the matplotlib fallback"""
+        backend = MagicMock(spec=['get_pixmap_bytes', 'get_pdf_bytes'])
+        backend.get_pixmap_bytes.return_value = b'P6 1 1 255\n\xff\xff\xff'
+        ok, image_open, save_png, fallback = self._render(backend)
+        self.assertTrue(ok)
+        fallback.assert_not_called()
+        backend.get_pdf_bytes.assert_not_called()
+        self.assertEqual(backend.get_pixmap_bytes.call_args.kwargs['dpi'], 150)
+        self.assertEqual(backend.get_pixmap_bytes.call_args.kwargs['fmt'], 'ppm')
+        save_png.assert_called_once()
+
+    def test_pdf_path_for_older_ezdxf(self):
+        """Test the PDF path when the backend has no get_pixmap_bytes"""
+        backend = MagicMock(spec=['get_pdf_bytes'])
+        with patch.object(CADProcessor, '_save_pixmap_png') as save_pixmap_png:
+            ok, _, _, fallback = self._render(backend)
+        self.assertTrue(ok)
+        fallback.assert_not_called()
+        backend.get_pdf_bytes.assert_called_once()
+        save_pixmap_png.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()